@@ -1,11 +1,32 @@
 # Builtings
+import bisect
 import ctypes
+import glob
+import hashlib
+import heapq
+import importlib.util
+import json
 import os
+import socketserver
 import string
+import subprocess
 import sys
 import tempfile
 import time
+import unicodedata
 import webbrowser
+from collections import (
+    Counter,
+    OrderedDict,
+)
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from contextlib import (
+    contextmanager,
+)
 from configparser import (
     ConfigParser,
 )
@@ -14,8 +35,23 @@ from datetime import (
     timedelta,
 )
 from functools import (
+    lru_cache,
     wraps,
 )
+from multiprocessing import (
+    freeze_support,
+    Pipe,
+    Process,
+    resource_tracker,
+)
+from multiprocessing.shared_memory import (
+    SharedMemory,
+)
+from queue import (
+    Empty,
+    Full,
+    Queue,
+)
 from threading import (
     Event,
     Lock,
@@ -26,43 +62,78 @@ from typing import (
     Any,
     Callable,
     Iterable,
+    Iterator,
     Mapping,
+    NamedTuple,
+    TextIO,
+    TYPE_CHECKING,
     Union,
 )
 
+
+def lazy_import(name: str) -> Any:
+    # Executed on first attribute access, missing modules still fail here
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named '{name}'")
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
 # Third-parties
 try:
-    import keyboard
-    import mouse  # type: ignore
-    import pyautogui  # type: ignore
-    from customtkinter import (  # type: ignore
-        set_appearance_mode,
-        CTk,
-        CTkButton,
-        CTkCheckBox,
-        CTkComboBox,
-        CTkEntry,
-        CTkFrame,
-        CTkLabel,
-        CTkProgressBar,
-        CTkScrollableFrame,
-        CTkSegmentedButton,
-        CTkSlider,
-        CTkSwitch,
-        CTkTabview,
-        CTkTextbox,
-    )
-    from keyboard import (
-        KeyboardEvent,
-    )
-    from mouse import (  # type: ignore
-        WheelEvent,
-        MoveEvent,
-        ButtonEvent,
-    )
-    from win10toast import (  # type: ignore
-        ToastNotifier,
-    )
+    import numpy as np
+
+    if TYPE_CHECKING or "--headless" not in sys.argv:
+        import keyboard
+        import mouse  # type: ignore
+        from customtkinter import (  # type: ignore
+            set_appearance_mode,
+            CTk,
+            CTkButton,
+            CTkCheckBox,
+            CTkComboBox,
+            CTkEntry,
+            CTkFrame,
+            CTkLabel,
+            CTkProgressBar,
+            CTkScrollableFrame,
+            CTkScrollbar,
+            CTkSegmentedButton,
+            CTkSlider,
+            CTkSwitch,
+            CTkTabview,
+            CTkTextbox,
+            CTkToplevel,
+        )
+        from keyboard import (
+            KeyboardEvent,
+        )
+        from mouse import (  # type: ignore
+            WheelEvent,
+            MoveEvent,
+            ButtonEvent,
+        )
+    else:
+        # Daemon never shows a window nor hooks input, searches are still typed
+        keyboard = lazy_import("keyboard")
+
+    if TYPE_CHECKING:
+        # Seen by type checkers and by the PyInstaller analysis
+        import cv2
+        import pyautogui  # type: ignore
+        import win10toast  # type: ignore
+        import xlsxwriter  # type: ignore
+    else:
+        # Heavy modules are executed on first use, after the window is shown
+        cv2 = lazy_import("cv2")
+        pyautogui = lazy_import("pyautogui")
+        # Toasts are a Windows feature, elsewhere they are left out
+        win10toast = lazy_import("win10toast") if os.name == "nt" else None
+        xlsxwriter = lazy_import("xlsxwriter")
 except ImportError as import_error:
     print(import_error)
     print("Run `python -m pip install --upgrade -r requirements.txt` first.")
@@ -80,10 +151,56 @@ __DATA_PATH__ = "data/"
 __ICON_FILE_NAME__ = "lafms.ico"
 __CONFIG_FILE_NAME__ = "lafms-config.ini"
 __DEFAULT_CONFIG_NAME__ = "default-config.ini"
+__IMAGES_DIR_NAME__ = "images"
+__TEMPLATE_CACHE_NAME__ = "lafms-templates"
+__TEMPLATE_BASE_HEIGHT__ = 1080
+__LATENCY_CACHE_NAME__ = "lafms-latency.json"
+__ITEMS_FILE_NAME__ = "items.txt"
+__ITEMS_CACHE_NAME__ = "item-index.json"
 
 __TIME_START_PROGRAM__ = datetime.now().strftime("%Y%m%d%H%M%S")
 __ASCII_LOWERCASE_LETTERS__ = dict(enumerate(string.ascii_lowercase))
-__NOTIFICATION_TOASTER__ = ToastNotifier()
+__REGION_NAMES__ = ("物品列表", "价格列", "页码", "类别树")
+__CATEGORY_NAMES__ = (
+    "时装",
+    "刻印书",
+    "强化材料",
+    "战斗道具",
+    "料理",
+    "生活",
+    "冒险之书",
+    "航海",
+    "宠物",
+    "坐骑",
+    "宝石",
+    "卡牌",
+    "其他",
+)
+__MAX_PAGES__ = 100
+__SEARCH_CATEGORY_NAME__ = "搜索"
+__ROWS_PER_PAGE__ = 10
+__DEFAULT_REGIONS__ = {
+    "1920x1080": "物品列表:600,290,560,520;价格列:1170,290,330,520;"
+    "页码:860,820,200,30;类别树:330,250,260,610;搜索框:600,250,400,30",
+    "2560x1440": "物品列表:800,387,747,693;价格列:1560,387,440,693;"
+    "页码:1147,1093,267,40;类别树:440,333,347,813;搜索框:800,333,533,40",
+}
+__NOTIFICATION_TOASTER__: Any = None
+
+
+def show_toast(message: str) -> None:
+    # Toaster is created on the first toast, win10toast pulls in pywin32
+    global __NOTIFICATION_TOASTER__
+    if win10toast is None:
+        return
+    if __NOTIFICATION_TOASTER__ is None:
+        __NOTIFICATION_TOASTER__ = win10toast.ToastNotifier()
+    __NOTIFICATION_TOASTER__.show_toast(
+        __WINDOW_TITLE__,
+        message,
+        os.path.join(__DATA_PATH__, __ICON_FILE_NAME__),
+        threaded=True,
+    )
 
 
 @overload
@@ -194,28 +311,2716 @@ def threaded_loop(
                 ).start()
                 return task_event
 
-        return wrapper
+        return wrapper
+
+    return decorator
+
+
+Region = tuple[int, int, int, int]
+
+
+def parse_regions(value: str) -> dict[str, Region]:
+    # Format: `name:x,y,width,height;name:x,y,width,height;...`
+    regions: dict[str, Region] = {}
+    for item in value.split(";"):
+        if item.strip() == "":
+            continue
+        name, rect = item.split(":", 1)
+        x, y, width, height = map(int, rect.split(","))
+        if width <= 0 or height <= 0:
+            raise ValueError(f"empty region {name.strip()}")
+        regions[name.strip()] = (x, y, width, height)
+    return regions
+
+
+def bound_regions(regions: Iterable[Region]) -> Region:
+    # Smallest region holding all of them
+    regions = list(regions)
+    left = min(x for x, _, _, _ in regions)
+    top = min(y for _, y, _, _ in regions)
+    return (
+        left,
+        top,
+        max(x + width for x, _, width, _ in regions) - left,
+        max(y + height for _, y, _, height in regions) - top,
+    )
+
+
+def read_regions(regions: Mapping[str, Region]) -> dict[str, Region]:
+    # Regions a page is read from, a listing panel replaces the columns it spans
+    names = ("列表", "页码") if "列表" in regions else ("物品列表", "数量列", "价格列", "页码")
+    return {name: regions[name] for name in names if name in regions}
+
+
+def crop_regions(
+    frame: np.ndarray, regions: Mapping[str, Region]
+) -> dict[str, np.ndarray]:
+    # Basic slicing only, every crop is a view sharing the frame memory
+    return {
+        name: frame[y : y + height, x : x + width]
+        for name, (x, y, width, height) in regions.items()
+    }
+
+
+class FrameSource(object):
+    """Base of all frame sources, frames are BGR views of one reused buffer."""
+
+    # Whether UI actions should really be sent to the captured screen
+    interactive = True
+
+    def __init__(self) -> None:
+        self._buffer: Union[np.ndarray, None] = None
+        self.resolution = (0, 0)
+        # Identifies the last grabbed frame, see `valid`
+        self.sequence = 0
+
+    def __enter__(self) -> "FrameSource":
+        self.open()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def _reserve(self, height: int, width: int, channels: int) -> np.ndarray:
+        # Reallocate only when frame geometry changes
+        if self._buffer is None or self._buffer.shape != (height, width, channels):
+            self._buffer = np.empty((height, width, channels), dtype=np.uint8)
+        return self._buffer
+
+    def open(self) -> None:
+        pass
+
+    def grab(self) -> np.ndarray:
+        raise NotImplementedError
+
+    def grab_regions(self, regions: Mapping[str, Region]) -> dict[str, np.ndarray]:
+        return crop_regions(self.grab(), regions)
+
+    def valid(self, sequence: int) -> bool:
+        # Whether frames grabbed at `sequence` are still intact, the buffer is
+        # only reused by the next grab
+        return True
+
+    def advance(self) -> None:
+        # Called after every UI action, live screens move on by themselves
+        pass
+
+    def close(self) -> None:
+        self._buffer = None
+
+
+class DesktopFrameSource(FrameSource):
+    """Captures the primary screen through GDI straight into the buffer."""
+
+    class _BitmapInfoHeader(ctypes.Structure):
+        _fields_ = [
+            ("biSize", ctypes.c_uint32),
+            ("biWidth", ctypes.c_int32),
+            ("biHeight", ctypes.c_int32),
+            ("biPlanes", ctypes.c_uint16),
+            ("biBitCount", ctypes.c_uint16),
+            ("biCompression", ctypes.c_uint32),
+            ("biSizeImage", ctypes.c_uint32),
+            ("biXPelsPerMeter", ctypes.c_int32),
+            ("biYPelsPerMeter", ctypes.c_int32),
+            ("biClrUsed", ctypes.c_uint32),
+            ("biClrImportant", ctypes.c_uint32),
+        ]
+
+    def open(self) -> None:
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        user32.GetDC.restype = ctypes.c_void_p
+        gdi32.CreateCompatibleDC.restype = ctypes.c_void_p
+        gdi32.CreateCompatibleDC.argtypes = [ctypes.c_void_p]
+        gdi32.CreateCompatibleBitmap.restype = ctypes.c_void_p
+        gdi32.CreateCompatibleBitmap.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+        ]
+        gdi32.SelectObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        gdi32.BitBlt.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_uint32,
+        ]
+        gdi32.GetDIBits.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.c_uint,
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
+        ]
+        gdi32.DeleteObject.argtypes = [ctypes.c_void_p]
+        gdi32.DeleteDC.argtypes = [ctypes.c_void_p]
+        user32.ReleaseDC.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        user32.SetProcessDPIAware()
+        self._width = user32.GetSystemMetrics(0)
+        self._height = user32.GetSystemMetrics(1)
+        self._hdc_screen = user32.GetDC(None)
+        self._hdc_memory = gdi32.CreateCompatibleDC(self._hdc_screen)
+        self._hbitmap = gdi32.CreateCompatibleBitmap(
+            self._hdc_screen, self._width, self._height
+        )
+        gdi32.SelectObject(self._hdc_memory, self._hbitmap)
+        # Negative height requests a top-down bitmap, 32 bits keeps rows aligned
+        self._bitmap_info = self._BitmapInfoHeader(
+            biSize=ctypes.sizeof(self._BitmapInfoHeader),
+            biWidth=self._width,
+            biHeight=-self._height,
+            biPlanes=1,
+            biBitCount=32,
+            biCompression=0,
+        )
+        self.resolution = (self._width, self._height)
+        # Per region bitmaps and buffers, reused until the region changes
+        self._region_captures: dict[
+            str, tuple[Region, Any, ctypes.Structure, np.ndarray]
+        ] = {}
+
+    def grab(self) -> np.ndarray:
+        buffer = self._reserve(self._height, self._width, 4)
+        self._blit(
+            self._hbitmap,
+            (0, 0, self._width, self._height),
+            self._bitmap_info,
+            buffer,
+        )
+        return buffer[:, :, :3]
+
+    def grab_regions(self, regions: Mapping[str, Region]) -> dict[str, np.ndarray]:
+        # Copy only the pixels inside regions instead of the whole desktop
+        frames: dict[str, np.ndarray] = {}
+        for name, region in regions.items():
+            capture = self._region_captures.get(name)
+            if capture is None or capture[0] != region:
+                if capture is not None:
+                    ctypes.windll.gdi32.SelectObject(self._hdc_memory, self._hbitmap)
+                    ctypes.windll.gdi32.DeleteObject(capture[1])
+                _, _, width, height = region
+                capture = (
+                    region,
+                    ctypes.windll.gdi32.CreateCompatibleBitmap(
+                        self._hdc_screen, width, height
+                    ),
+                    self._BitmapInfoHeader(
+                        biSize=ctypes.sizeof(self._BitmapInfoHeader),
+                        biWidth=width,
+                        biHeight=-height,
+                        biPlanes=1,
+                        biBitCount=32,
+                        biCompression=0,
+                    ),
+                    np.empty((height, width, 4), dtype=np.uint8),
+                )
+                self._region_captures[name] = capture
+            _, hbitmap, bitmap_info, buffer = capture
+            self._blit(hbitmap, region, bitmap_info, buffer)
+            frames[name] = buffer[:, :, :3]
+        return frames
+
+    def _blit(
+        self,
+        hbitmap: Any,
+        region: Region,
+        bitmap_info: ctypes.Structure,
+        buffer: np.ndarray,
+    ) -> None:
+        x, y, width, height = region
+        ctypes.windll.gdi32.SelectObject(self._hdc_memory, hbitmap)
+        ctypes.windll.gdi32.BitBlt(
+            self._hdc_memory,
+            0,
+            0,
+            width,
+            height,
+            self._hdc_screen,
+            x,
+            y,
+            0x00CC0020,
+        )
+        ctypes.windll.gdi32.GetDIBits(
+            self._hdc_memory,
+            hbitmap,
+            0,
+            height,
+            buffer.ctypes.data,
+            ctypes.byref(bitmap_info),
+            0,
+        )
+
+    def close(self) -> None:
+        if hasattr(self, "_hbitmap"):
+            ctypes.windll.gdi32.SelectObject(self._hdc_memory, self._hbitmap)
+            for _, hbitmap, _, _ in self._region_captures.values():
+                ctypes.windll.gdi32.DeleteObject(hbitmap)
+            self._region_captures.clear()
+            ctypes.windll.gdi32.DeleteObject(self._hbitmap)
+            ctypes.windll.gdi32.DeleteDC(self._hdc_memory)
+            ctypes.windll.user32.ReleaseDC(None, self._hdc_screen)
+            del self._hbitmap
+        super().close()
+
+
+class ReplayFrameSource(FrameSource):
+    """Streams recorded PNG/NPY frames of a directory at a given frame rate.
+
+    Frames are picked by wall time so that repeated grabs see the same frame
+    until the next one is due, just like a live screen. A non-positive frame
+    rate instead advances one frame per UI action, as fast as possible.
+    """
+
+    interactive = False
+
+    def __init__(
+        self,
+        replay_path: str,
+        frame_rate: float = 0.0,
+        loop: bool = False,
+    ) -> None:
+        super().__init__()
+        self._replay_path = replay_path
+        self._frame_rate = frame_rate
+        self._loop = loop
+        self._frame_paths: list[str] = []
+        self._frame_index = -1
+        self._loaded_index = -1
+        self._start_time = 0.0
+        self.exhausted = False
+
+    def open(self) -> None:
+        self._frame_paths = sorted(
+            path
+            for path in glob.glob(os.path.join(self._replay_path, "*"))
+            if path.lower().endswith((".png", ".npy"))
+        )
+        if not self._frame_paths:
+            raise FileNotFoundError(f"no frames found in {self._replay_path}")
+        self._frame_index = 0
+        self._start_time = time.perf_counter()
+        self.exhausted = False
+        # Recordings are expected to share the resolution of their first frame
+        self._load(self._frame_paths[0])
+        self._loaded_index = 0
+        assert self._buffer is not None
+        self.resolution = (self._buffer.shape[1], self._buffer.shape[0])
+
+    def __len__(self) -> int:
+        return len(self._frame_paths)
+
+    @property
+    def frame_path(self) -> str:
+        return self._frame_paths[self._frame_index]
+
+    def advance(self) -> None:
+        if self._frame_rate <= 0:
+            self._seek(self._frame_index + 1)
+
+    def _seek(self, frame_index: int) -> None:
+        if frame_index >= len(self._frame_paths):
+            if self._loop:
+                frame_index %= len(self._frame_paths)
+            else:
+                frame_index = len(self._frame_paths) - 1
+                self.exhausted = True
+        self._frame_index = frame_index
+
+    def grab(self) -> np.ndarray:
+        if self._frame_rate > 0:
+            self._seek(int((time.perf_counter() - self._start_time) * self._frame_rate))
+        frame_index = self._frame_index
+        if frame_index != self._loaded_index:
+            self._load(self._frame_paths[frame_index])
+            self._loaded_index = frame_index
+        assert self._buffer is not None
+        return self._buffer
+
+    def _load(self, frame_path: str) -> None:
+        if frame_path.lower().endswith(".npy"):
+            # Memory-mapped read, pixels are copied once into the buffer
+            frame = np.load(frame_path, mmap_mode="r")
+        else:
+            frame = cv2.imread(frame_path, cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError(f"unable to decode frame {frame_path}")
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis].repeat(3, axis=2)
+        height, width = frame.shape[:2]
+        np.copyto(self._reserve(height, width, 3), frame[:, :, :3])
+
+
+def _run_capture_service(
+    frame_source: FrameSource,
+    slots_count: int,
+    frame_rate: float,
+    connection: Any,
+) -> None:
+    # Header holds the latest sequence, the advance generation of that frame
+    # and the sequence currently stored in every slot
+    try:
+        frame_source.open()
+        width, height = frame_source.resolution
+        header = SharedMemory(create=True, size=8 * (2 + slots_count))
+        slots = [
+            SharedMemory(create=True, size=width * height * 3)
+            for _ in range(slots_count)
+        ]
+    except Exception as service_error:
+        connection.send(service_error)
+        return
+    sequences = np.ndarray((2 + slots_count,), dtype=np.int64, buffer=header.buf)
+    sequences[:] = -1
+    frames = [
+        np.ndarray((height, width, 3), dtype=np.uint8, buffer=slot.buf)
+        for slot in slots
+    ]
+    sequence = generation = 0
+
+    def publish() -> None:
+        # Slot is marked as being written, readers check its sequence after use
+        slot_index = sequence % slots_count
+        sequences[2 + slot_index] = -1
+        np.copyto(frames[slot_index], frame_source.grab())
+        sequences[2 + slot_index] = sequence
+        sequences[1] = generation
+        sequences[0] = sequence
+
+    publish()
+    connection.send((header.name, [slot.name for slot in slots], (width, height)))
+    interval = 1.0 / frame_rate if frame_rate > 0 else float("inf")
+    next_time = time.monotonic() + interval
+    try:
+        while True:
+            # Advance requests wake the service up before the next frame is due
+            if connection.poll(min(max(next_time - time.monotonic(), 0.0), 1.0)):
+                if connection.recv() is None:
+                    break
+                frame_source.advance()
+                generation += 1
+            elif time.monotonic() < next_time:
+                continue
+            sequence += 1
+            publish()
+            next_time = time.monotonic() + interval
+    except (EOFError, OSError):
+        pass
+    finally:
+        # The collector unlinks the memory, it may outlive this process
+        del sequences, frames
+        header.close()
+        for slot in slots:
+            slot.close()
+        frame_source.close()
+
+
+class CaptureServiceFrameSource(FrameSource):
+    """Runs another frame source in its own process behind a shared ring.
+
+    The service writes whole frames into a ring of shared memory slots along
+    with their sequence numbers, so grabbing the latest frame is a view into
+    a slot, neither copied nor pickled. A frame stays valid until the service
+    wraps around the ring, which `valid` tells.
+    """
+
+    def __init__(
+        self,
+        frame_source: FrameSource,
+        slots_count: int = 8,
+        frame_rate: float = 30.0,
+        timeout: float = 5.0,
+    ) -> None:
+        super().__init__()
+        self.interactive = frame_source.interactive
+        self._frame_source = frame_source
+        self._slots_count = slots_count
+        self._frame_rate = frame_rate
+        self._timeout = timeout
+        self._process: Union[Process, None] = None
+        self._connection: Any = None
+        self._header: Union[SharedMemory, None] = None
+        self._slots: list[SharedMemory] = []
+        self._sequences: Union[np.ndarray, None] = None
+        self._frames: list[np.ndarray] = []
+        self._generation = 0
+
+    def open(self) -> None:
+        if os.name == "posix":
+            # Shared with the service, which would otherwise start its own and
+            # have the memory unlinked as soon as it exits
+            resource_tracker.ensure_running()
+        self._connection, service_connection = Pipe()
+        self._process = Process(
+            target=_run_capture_service,
+            args=(
+                self._frame_source,
+                self._slots_count,
+                self._frame_rate,
+                service_connection,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        service_connection.close()
+        if not self._connection.poll(self._timeout):
+            self.close()
+            raise TimeoutError("capture service did not start in time")
+        message = self._connection.recv()
+        if isinstance(message, Exception):
+            self.close()
+            raise message
+        header_name, slot_names, self.resolution = message
+        width, height = self.resolution
+        self._header = SharedMemory(name=header_name)
+        self._slots = [SharedMemory(name=slot_name) for slot_name in slot_names]
+        self._sequences = np.ndarray(
+            (2 + self._slots_count,), dtype=np.int64, buffer=self._header.buf
+        )
+        self._frames = [
+            np.ndarray((height, width, 3), dtype=np.uint8, buffer=slot.buf)
+            for slot in self._slots
+        ]
+        self._generation = 0
+
+    def grab(self) -> np.ndarray:
+        assert self._sequences is not None
+        self.sequence = int(self._sequences[0])
+        return self._frames[self.sequence % self._slots_count]
+
+    def valid(self, sequence: int) -> bool:
+        # Whether the frame of `sequence` has not been overwritten yet
+        assert self._sequences is not None
+        return int(self._sequences[2 + sequence % self._slots_count]) == sequence
+
+    def advance(self) -> None:
+        # Frames published before the action was requested are never returned
+        assert self._sequences is not None
+        self._generation += 1
+        self._connection.send(True)
+        deadline = time.monotonic() + self._timeout
+        while self._sequences[1] < self._generation and time.monotonic() < deadline:
+            time.sleep(0.0005)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+        if self._process is not None:
+            self._process.join(self._timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._sequences = None
+        self._frames.clear()
+        for shared_memory in (self._header, *self._slots):
+            if shared_memory is None:
+                continue
+            try:
+                shared_memory.close()
+            except BufferError:
+                # A grabbed frame is still referenced, unmapped when released
+                pass
+            shared_memory.unlink()
+        self._header = None
+        self._slots.clear()
+        super().close()
+
+
+class TemplateRegistry(object):
+    """Grayscale templates of `data/images`, pre-scaled and cached on disk.
+
+    Templates authored for 1080p are scaled once per resolution and UI scale,
+    then packed into one cache file which later startups memory-map instead
+    of decoding and resizing every image again.
+    """
+
+    def __init__(self, images_path: str, cache_path: str) -> None:
+        self._images_path = images_path
+        self._cache_path = cache_path
+        self._cache: Union[np.memmap, None] = None
+        self._templates: dict[str, np.ndarray] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._templates[name]
+
+    def names(self, prefix: str = "") -> list[str]:
+        return [name for name in self._templates if name.startswith(prefix)]
+
+    def load(self, resolution: tuple[int, int], ui_scale: float) -> bool:
+        # Returns whether templates were served from the cache file
+        image_paths = sorted(
+            glob.glob(os.path.join(self._images_path, "**", "*.png"), recursive=True)
+        )
+        signature: dict[str, Any] = {
+            "resolution": list(resolution),
+            "scale": resolution[1] / __TEMPLATE_BASE_HEIGHT__ * ui_scale,
+            "files": [
+                [
+                    os.path.relpath(image_path, self._images_path),
+                    os.stat(image_path).st_mtime_ns,
+                    os.stat(image_path).st_size,
+                ]
+                for image_path in image_paths
+            ],
+        }
+        self._templates.clear()
+        self._cache = None
+        try:
+            with open(f"{self._cache_path}.json", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest["signature"] == signature:
+                self._map(manifest["entries"])
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+        self._build(image_paths, signature)
+        return False
+
+    def _build(self, image_paths: list[str], signature: dict[str, Any]) -> None:
+        scale = float(signature["scale"])
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        entries: list[list[Any]] = []
+        offset = 0
+        with open(f"{self._cache_path}.bin.tmp", mode="wb") as cache_file:
+            for image_path in image_paths:
+                # Decoding from bytes keeps non-ASCII paths working on Windows
+                template = cv2.imdecode(
+                    np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_GRAYSCALE
+                )
+                if template is None:
+                    continue
+                if scale != 1.0:
+                    template = cv2.resize(
+                        template,
+                        None,
+                        fx=scale,
+                        fy=scale,
+                        interpolation=interpolation,
+                    )
+                relative_path = os.path.relpath(image_path, self._images_path)
+                name = os.path.splitext(relative_path)[0].replace(os.sep, "/")
+                cache_file.write(np.ascontiguousarray(template).tobytes())
+                entries.append([name, offset, template.shape[0], template.shape[1]])
+                offset += template.size
+        os.replace(f"{self._cache_path}.bin.tmp", f"{self._cache_path}.bin")
+        with open(
+            f"{self._cache_path}.json", mode="w", encoding="utf-8"
+        ) as manifest_file:
+            json.dump({"signature": signature, "entries": entries}, manifest_file)
+        self._map(entries)
+
+    def _map(self, entries: list[list[Any]]) -> None:
+        if not entries:
+            return
+        self._cache = np.memmap(f"{self._cache_path}.bin", dtype=np.uint8, mode="r")
+        for name, offset, height, width in entries:
+            self._templates[name] = self._cache[
+                offset : offset + height * width
+            ].reshape(height, width)
+
+    def match(
+        self,
+        name: str,
+        image: np.ndarray,
+        threshold: float = 0.9,
+    ) -> Union[tuple[int, int, float], None]:
+        # Best match as (x, y, score), or None when below threshold
+        template = self._templates[name]
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if image.shape[0] < template.shape[0] or image.shape[1] < template.shape[1]:
+            return None
+        scores = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(scores)
+        if score < threshold:
+            return None
+        return x, y, score
+
+
+class Listing(NamedTuple):
+    name: str
+    price: int
+    quantity: int = 1
+
+
+def parse_price(text: str) -> Union[int, None]:
+    digits = text.replace(",", "").replace(".", "")
+    if digits == "" or not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def normalize_name(name: str) -> str:
+    # Full-width forms, letter case and spaces vary between sources
+    return "".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def batch_by_prefix(
+    names: Iterable[str],
+    min_prefix: int,
+    max_size: int,
+    known_names: Iterable[str] = (),
+) -> list[tuple[str, list[str]]]:
+    # Sorted neighbours sharing `min_prefix` characters are found by one search,
+    # as long as every known name the search matches fits in `max_size` rows
+    names = sorted(set(names))
+    known_names = sorted(set(known_names).union(names))
+
+    def count_matches(prefix: str) -> int:
+        return bisect.bisect_right(
+            known_names, f"{prefix}\U0010ffff"
+        ) - bisect.bisect_left(known_names, prefix)
+
+    batches: list[tuple[str, list[str]]] = []
+    prefix, batch = "", []
+    for name in names:
+        common_prefix = os.path.commonprefix([prefix, name])
+        if (
+            batch
+            and len(common_prefix) >= min_prefix
+            and count_matches(common_prefix) <= max_size
+        ):
+            prefix = common_prefix
+            batch.append(name)
+            continue
+        if batch:
+            batches.append((prefix, batch))
+        prefix, batch = name, [name]
+    if batch:
+        batches.append((prefix, batch))
+    # Names shorter than `min_prefix` may leave equal queries next to each other
+    merged_batches: list[tuple[str, list[str]]] = []
+    for prefix, batch in batches:
+        if merged_batches and merged_batches[-1][0] == prefix:
+            merged_batches[-1][1].extend(batch)
+        else:
+            merged_batches.append((prefix, batch))
+    return merged_batches
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    # Levenshtein distance, anything above `limit` is reported as `limit + 1`
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = list(range(len(second) + 1))
+    for index, char in enumerate(first, 1):
+        current = [index]
+        for other_index, other_char in enumerate(second, 1):
+            current.append(
+                min(
+                    previous[other_index] + 1,
+                    current[other_index - 1] + 1,
+                    previous[other_index - 1] + (char != other_char),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class ItemMatch(NamedTuple):
+    name: str
+    distance: int
+
+
+class ItemDictionary(object):
+    """Canonical item names that recognized text is snapped to.
+
+    Names are indexed by their character trigrams, so only the few entries
+    sharing most trigrams with the text are compared by edit distance. Text
+    equally close to two entries, e.g. tiers of one engraving book, is left
+    unmatched rather than guessed.
+    """
+
+    def __init__(
+        self,
+        max_error: float = 0.25,
+        candidates_count: int = 16,
+        cache_size: int = 8192,
+    ) -> None:
+        self._max_error = max_error
+        self._candidates_count = candidates_count
+        self._names: list[str] = []
+        self._normalized_names: list[str] = []
+        self._exact: dict[str, int] = {}
+        self._postings: dict[str, list[int]] = {}
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    @property
+    def names(self) -> list[str]:
+        return self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def load(self, items_path: str, cache_path: str) -> bool:
+        # Returns whether the index was served from the cache file
+        stat = os.stat(items_path)
+        signature = [os.path.abspath(items_path), stat.st_mtime_ns, stat.st_size]
+        self.resolve.cache_clear()
+        try:
+            with open(cache_path, encoding="utf-8") as cache_file:
+                cache = json.load(cache_file)
+            if cache["signature"] == signature:
+                self._names = cache["names"]
+                self._normalized_names = cache["normalized_names"]
+                self._exact, self._postings = cache["exact"], cache["postings"]
+                return True
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self._build(items_path)
+        try:
+            with open(f"{cache_path}.tmp", mode="w", encoding="utf-8") as cache_file:
+                json.dump(
+                    {
+                        "signature": signature,
+                        "names": self._names,
+                        "normalized_names": self._normalized_names,
+                        "exact": self._exact,
+                        "postings": self._postings,
+                    },
+                    cache_file,
+                    ensure_ascii=False,
+                )
+            os.replace(f"{cache_path}.tmp", cache_path)
+        except OSError:
+            # Names are indexed again next time
+            pass
+        return False
+
+    def _build(self, items_path: str) -> None:
+        # One name per line, blank lines and comments are skipped, so are the
+        # ids of `id<TAB>name` lines exported from item tables
+        self._names, self._normalized_names = [], []
+        self._exact, self._postings = {}, {}
+        with open(items_path, encoding="utf-8") as items_file:
+            for line in items_file:
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                name = line.rpartition("\t")[2]
+                normalized_name = normalize_name(name)
+                if normalized_name == "" or normalized_name in self._exact:
+                    continue
+                index = len(self._names)
+                self._names.append(name.strip())
+                self._normalized_names.append(normalized_name)
+                self._exact[normalized_name] = index
+                for gram in self._grams(normalized_name):
+                    self._postings.setdefault(gram, []).append(index)
+
+    @staticmethod
+    def _grams(normalized_name: str) -> set[str]:
+        # Padding lets one or two character names have trigrams as well
+        padded = f"\x02\x02{normalized_name}\x03"
+        return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+    def _match(self, index: int, distance: int) -> ItemMatch:
+        return ItemMatch(self._names[index], distance)
+
+    def _resolve(self, text: str) -> Union[ItemMatch, None]:
+        normalized_text = normalize_name(text)
+        if normalized_text in self._exact:
+            return self._match(self._exact[normalized_text], 0)
+        shared_counts: dict[int, int] = {}
+        for gram in self._grams(normalized_text):
+            for index in self._postings.get(gram, ()):
+                shared_counts[index] = shared_counts.get(index, 0) + 1
+        limit = max(1, int(len(normalized_text) * self._max_error))
+        best_index, best_distance, ambiguous = -1, limit + 1, False
+        for index in heapq.nlargest(
+            self._candidates_count, shared_counts, key=shared_counts.__getitem__
+        ):
+            distance = edit_distance(
+                normalized_text, self._normalized_names[index], limit
+            )
+            if distance < best_distance:
+                best_index, best_distance, ambiguous = index, distance, False
+            elif distance == best_distance:
+                ambiguous = True
+        if best_index < 0 or ambiguous or best_distance > limit:
+            return None
+        return self._match(best_index, best_distance)
+
+
+def find_runs(profile: np.ndarray) -> np.ndarray:
+    # Start (inclusive) and end (exclusive) of every truthy run, shape (n, 2)
+    edges = np.diff(np.concatenate(([0], profile.astype(np.int8), [0])))
+    return np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)), axis=1)
+
+
+def segment_listing(
+    mask: np.ndarray, min_gap: Union[int, None] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    # Row and cell boundaries of a binarized listing panel, both shape (n, 2),
+    # from its horizontal and vertical projection profiles
+    row_bands = find_runs(mask.any(axis=1))
+    if row_bands.size == 0:
+        return row_bands, row_bands
+    if min_gap is None:
+        # Glyph and word gaps are narrower than a row is high, column gaps wider
+        min_gap = 2 * int((row_bands[:, 1] - row_bands[:, 0]).max())
+    column_runs = find_runs(mask.any(axis=0))
+    keep = np.ones(len(column_runs), dtype=bool)
+    keep[1:] = column_runs[1:, 0] - column_runs[:-1, 1] >= min_gap
+    column_bands = np.stack(
+        (
+            column_runs[keep, 0],
+            np.maximum.reduceat(column_runs[:, 1], np.flatnonzero(keep)),
+        ),
+        axis=1,
+    )
+    return row_bands, column_bands
+
+
+class GlyphRecognizer(object):
+    """Recognizes text of a fixed font by matching glyph bitmaps.
+
+    Glyphs are segmented for all rows of a column at once, and every distinct
+    bitmap is classified only once thanks to a LRU cache keyed by its bits.
+    """
+
+    _size = (10, 14)
+
+    def __init__(
+        self,
+        glyphs: Mapping[str, np.ndarray],
+        cache_size: int = 4096,
+        max_error: float = 0.2,
+        threshold: int = 127,
+    ) -> None:
+        self._threshold = threshold
+        self._chars = list(glyphs)
+        self._references = np.zeros((len(glyphs), np.prod(self._size)), dtype=bool)
+        self._heights = np.zeros(len(glyphs), dtype=np.int32)
+        for index, glyph in enumerate(glyphs.values()):
+            mask = self.binarize(glyph)
+            self._references[index] = self._normalize(mask).reshape(-1)
+            self._heights[index] = np.count_nonzero(mask.any(axis=1))
+        self._max_error = max_error
+        self._classify_cached = lru_cache(maxsize=cache_size)(self._classify)
+
+    @classmethod
+    def from_registry(
+        cls, registry: TemplateRegistry, prefix: str = "glyphs/"
+    ) -> "GlyphRecognizer":
+        # File names are the characters themselves, except for punctuations
+        aliases = {"comma": ",", "dot": ".", "slash": "/"}
+        return cls(
+            {
+                aliases.get(name[len(prefix) :], name[len(prefix) :]): registry[name]
+                for name in registry.names(prefix)
+            }
+        )
+
+    @property
+    def cache_info(self) -> Any:
+        return self._classify_cached.cache_info()
+
+    def binarize(self, image: np.ndarray) -> np.ndarray:
+        # Light text over dark background, a fixed threshold keeps glyphs of
+        # pages and references identical and blank cells blank
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image > self._threshold
+
+    @classmethod
+    def _normalize(cls, glyph: np.ndarray) -> np.ndarray:
+        rows = np.flatnonzero(glyph.any(axis=1))
+        columns = np.flatnonzero(glyph.any(axis=0))
+        if rows.size:
+            glyph = glyph[rows[0] : rows[-1] + 1, columns[0] : columns[-1] + 1]
+        return (
+            cv2.resize(
+                glyph.astype(np.uint8) * 255, cls._size, interpolation=cv2.INTER_AREA
+            )
+            > 127
+        )
+
+    def _classify(self, key: bytes) -> str:
+        height, width = map(int, np.frombuffer(key[:4], dtype=np.uint16))
+        glyph = np.unpackbits(np.frombuffer(key[4:], dtype=np.uint8))
+        glyph = glyph[: height * width].reshape(height, width).astype(bool)
+        if not self._chars:
+            return "?"
+        errors = np.count_nonzero(
+            self._references != self._normalize(glyph).reshape(-1), axis=1
+        )
+        # Normalizing loses the size, which tells commas and dots from digits
+        glyph_height = np.count_nonzero(glyph.any(axis=1))
+        mismatched = np.abs(self._heights - glyph_height) > max(2, glyph_height // 3)
+        errors[mismatched] = self._references.shape[1]
+        best = int(np.argmin(errors))
+        if errors[best] > self._max_error * self._references.shape[1]:
+            return "?"
+        return self._chars[best]
+
+    def find_rows(self, mask: np.ndarray) -> np.ndarray:
+        return find_runs(mask.any(axis=1))
+
+    def recognize_column(
+        self,
+        image: np.ndarray,
+        row_bands: Union[np.ndarray, None] = None,
+        merge_gap: int = 0,
+    ) -> list[str]:
+        mask = image if image.dtype == bool else self.binarize(image)
+        if row_bands is None:
+            row_bands = self.find_rows(mask)
+        row_bands = np.clip(row_bands, 0, mask.shape[0])
+        row_bands = row_bands[row_bands[:, 1] > row_bands[:, 0]]
+        if row_bands.size == 0:
+            return []
+        # Column occupancy of every row band in one reduction, a band reaching
+        # the bottom edge simply reduces till the end
+        indices = row_bands.reshape(-1)
+        if indices[-1] == mask.shape[0]:
+            indices = indices[:-1]
+        occupancy = np.logical_or.reduceat(mask, indices, axis=0)[::2]
+        edges = np.diff(
+            np.pad(occupancy.astype(np.int8), ((0, 0), (1, 1))),
+            axis=1,
+        )
+        band_indices, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        if merge_gap > 0 and starts.size > 1:
+            # Join parts of one glyph, e.g. radicals of a CJK character
+            keep = np.ones(starts.size, dtype=bool)
+            keep[1:] = (band_indices[1:] != band_indices[:-1]) | (
+                starts[1:] - ends[:-1] > merge_gap
+            )
+            band_indices, starts = band_indices[keep], starts[keep]
+            ends = np.maximum.reduceat(ends, np.flatnonzero(keep))
+        texts = [""] * len(row_bands)
+        for band_index, start, end in zip(
+            band_indices.tolist(), starts.tolist(), ends.tolist()
+        ):
+            top, bottom = row_bands[band_index]
+            glyph = mask[top:bottom, start:end]
+            key = (
+                np.array(glyph.shape, dtype=np.uint16).tobytes()
+                + np.packbits(glyph).tobytes()
+            )
+            texts[band_index] += self._classify_cached(key)
+        return texts
+
+
+def recognize_listings(
+    glyph_recognizer: GlyphRecognizer,
+    regions: Mapping[str, Region],
+    frames: Mapping[str, np.ndarray],
+) -> tuple[list[Listing], list[str]]:
+    # Returns listings along with the rows that could not be parsed
+    if "列表" in frames:
+        # Whole panel is segmented at once, cells are views of one mask
+        panel_mask = glyph_recognizer.binarize(frames["列表"])
+        row_bands, column_bands = segment_listing(panel_mask)
+        cells = [panel_mask[:, left:right] for left, right in column_bands.tolist()]
+        if len(cells) < 2:
+            return [], [f"列表仅分割出{len(cells)}列"] if row_bands.size else []
+        # Name comes first and price last, a cell in between is the quantity
+        names = glyph_recognizer.recognize_column(cells[0], row_bands, merge_gap=2)
+        prices = glyph_recognizer.recognize_column(cells[-1], row_bands)
+        quantities = (
+            glyph_recognizer.recognize_column(cells[1], row_bands)
+            if len(cells) > 2
+            else ["1"] * len(prices)
+        )
+    else:
+        price_mask = glyph_recognizer.binarize(frames["价格列"])
+        # Rows are found on the price column and shared with the item list
+        row_bands = glyph_recognizer.find_rows(price_mask)
+        prices = glyph_recognizer.recognize_column(price_mask, row_bands)
+        names = glyph_recognizer.recognize_column(
+            frames["物品列表"],
+            row_bands + (regions["价格列"][1] - regions["物品列表"][1]),
+            merge_gap=2,
+        )
+        # Quantity column is optional, listings default to single units
+        quantities = (
+            glyph_recognizer.recognize_column(
+                frames["数量列"],
+                row_bands + (regions["价格列"][1] - regions["数量列"][1]),
+            )
+            if "数量列" in frames
+            else ["1"] * len(prices)
+        )
+    listings: list[Listing] = []
+    unreadable_rows: list[str] = []
+    for name, price_text, quantity_text in zip(names, prices, quantities):
+        price = parse_price(price_text)
+        quantity = parse_price(quantity_text)
+        if name == "" or price is None or quantity is None:
+            unreadable_rows.append(f"{name or '?'} {price_text}")
+            continue
+        listings.append(Listing(name, price, quantity))
+    return listings, unreadable_rows
+
+
+class SharedFrames(NamedTuple):
+    slot_name: str
+    # Region name to offset and shape inside the slot
+    layout: dict[str, tuple[int, tuple[int, ...]]]
+
+
+class SharedFramePool(object):
+    """Fixed set of shared memory slots that captured regions are copied to.
+
+    Recognition processes map the same slots, so pages reach them without
+    being pickled. Storing blocks while every slot is in use.
+    """
+
+    def __init__(self, slots_count: int, slot_size: int) -> None:
+        self.slot_size = slot_size
+        self._slots: dict[str, SharedMemory] = {}
+        self._free_slots: Queue[str] = Queue()
+        for _ in range(slots_count):
+            slot = SharedMemory(create=True, size=slot_size)
+            self._slots[slot.name] = slot
+            self._free_slots.put(slot.name)
+
+    def store(
+        self, frames: Mapping[str, np.ndarray]
+    ) -> tuple[SharedFrames, dict[str, np.ndarray]]:
+        if sum(frame.nbytes for frame in frames.values()) > self.slot_size:
+            raise ValueError("采集区域超出共享内存大小")
+        slot_name = self._free_slots.get()
+        buffer = self._slots[slot_name].buf
+        layout: dict[str, tuple[int, tuple[int, ...]]] = {}
+        views: dict[str, np.ndarray] = {}
+        offset = 0
+        for name, frame in frames.items():
+            views[name] = np.ndarray(
+                frame.shape, dtype=np.uint8, buffer=buffer, offset=offset
+            )
+            np.copyto(views[name], frame)
+            layout[name] = (offset, frame.shape)
+            offset += frame.nbytes
+        return SharedFrames(slot_name, layout), views
+
+    def release(self, shared_frames: SharedFrames) -> None:
+        self._free_slots.put(shared_frames.slot_name)
+
+    def close(self) -> None:
+        for slot in self._slots.values():
+            slot.close()
+            slot.unlink()
+        self._slots.clear()
+
+
+# State of the current recognition process
+_recognition_worker: dict[str, Any] = {}
+
+
+def _initialize_recognition_worker(
+    images_path: str,
+    cache_path: str,
+    resolution: tuple[int, int],
+    ui_scale: float,
+) -> None:
+    # Templates are memory-mapped from the cache written by the main process
+    template_registry = TemplateRegistry(images_path, cache_path)
+    template_registry.load(resolution, ui_scale)
+    _recognition_worker["template_registry"] = template_registry
+    _recognition_worker["glyph_recognizer"] = GlyphRecognizer.from_registry(
+        template_registry
+    )
+    _recognition_worker["slots"] = {}
+
+
+def _recognize_shared_frames(
+    shared_frames: SharedFrames, regions: Mapping[str, Region]
+) -> tuple[list[Listing], list[str]]:
+    slots: dict[str, SharedMemory] = _recognition_worker["slots"]
+    if shared_frames.slot_name not in slots:
+        # Slots stay attached, the main process reuses them for every page
+        slots[shared_frames.slot_name] = SharedMemory(name=shared_frames.slot_name)
+    buffer = slots[shared_frames.slot_name].buf
+    frames = {
+        name: np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offset)
+        for name, (offset, shape) in shared_frames.layout.items()
+    }
+    return recognize_listings(_recognition_worker["glyph_recognizer"], regions, frames)
+
+
+class RegionHashCache(object):
+    """LRU cache of parsed results keyed by a fingerprint of the regions.
+
+    Fingerprints hash the raw pixels of the regions, which is cheap compared
+    with recognition and tells apart any two differing pages.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._capacity = capacity
+        self._entries: OrderedDict[bytes, Any] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fingerprint(self, *images: np.ndarray) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        for image in images:
+            digest.update(np.array(image.shape, dtype=np.uint16).tobytes())
+            # Crops are strided views, hashed row by row without a copy
+            for row in image:
+                digest.update(row)
+        return digest.digest()
+
+    def get(self, key: bytes) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: bytes, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+
+class LatencyHistogram(object):
+    """Log-bucketed latencies between 1ms and 10s."""
+
+    _bounds = np.geomspace(0.001, 10.0, 49)
+
+    def __init__(self, counts: Union[Iterable[int], None] = None) -> None:
+        self._counts = np.zeros(self._bounds.size + 1, dtype=np.int64)
+        if counts is not None:
+            self._counts[:] = list(counts)
+
+    @property
+    def count(self) -> int:
+        return int(self._counts.sum())
+
+    def record(self, seconds: float) -> None:
+        self._counts[np.searchsorted(self._bounds, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the quantile
+        cumulative = np.cumsum(self._counts)
+        index = int(np.searchsorted(cumulative, q * cumulative[-1]))
+        return float(self._bounds[min(index, self._bounds.size - 1)])
+
+    def to_list(self) -> list[int]:
+        return self._counts.tolist()
+
+
+class ScanMetrics(object):
+    """Stage latencies, page throughput and queue depths of one scan cycle.
+
+    Stages are recorded from the collecting thread and the pipeline threads
+    alike, queue depths keep the deepest value sampled.
+    """
+
+    stages = ("navigate", "wait", "capture", "recognize", "persist")
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {stage: LatencyHistogram() for stage in self.stages}
+            self._totals = dict.fromkeys(self.stages, 0.0)
+            self._queue_depths: dict[str, int] = {}
+            self._start_time = time.monotonic()
+            self.pages_count = 0
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start_time)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._histograms[stage].record(seconds)
+            self._totals[stage] += seconds
+
+    def count_page(self) -> None:
+        with self._lock:
+            self.pages_count += 1
+
+    def sample_queue(self, name: str, depth: int) -> None:
+        with self._lock:
+            self._queue_depths[name] = max(self._queue_depths.get(name, 0), depth)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages_count / max(time.monotonic() - self._start_time, 1e-9)
+
+    def quantile(self, stage: str, q: float) -> float:
+        with self._lock:
+            histogram = self._histograms[stage]
+            return histogram.quantile(q) if histogram.count else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        # Milliseconds, quantiles are upper bounds of log-spaced buckets
+        with self._lock:
+            return {
+                "elapsed": round(time.monotonic() - self._start_time, 3),
+                "pages": self.pages_count,
+                "pages_per_second": round(self.pages_per_second, 3),
+                "stages": {
+                    stage: {
+                        "count": histogram.count,
+                        "total": round(self._totals[stage] * 1000, 1),
+                        "p50": round(histogram.quantile(0.5) * 1000, 1)
+                        if histogram.count
+                        else 0.0,
+                        "p95": round(histogram.quantile(0.95) * 1000, 1)
+                        if histogram.count
+                        else 0.0,
+                    }
+                    for stage, histogram in self._histograms.items()
+                },
+                "queue_depths": dict(self._queue_depths),
+            }
+
+
+class RenderWaiter(object):
+    """Waits for the screen to settle after UI actions instead of sleeping.
+
+    Once a region changed and two consecutive captures match, or a template
+    shows up, the action is considered rendered. Latencies are recorded per
+    action, and later waits skip polling for renders faster than ever seen
+    and give up well after the slowest ones.
+    """
+
+    _warmup = 8
+
+    def __init__(
+        self,
+        frame_source: FrameSource,
+        template_registry: TemplateRegistry,
+        timeout: float = 5.0,
+        tolerance: int = 8,
+        scan_metrics: Union[ScanMetrics, None] = None,
+    ) -> None:
+        self._frame_source = frame_source
+        self._template_registry = template_registry
+        self._timeout = timeout
+        self._tolerance = tolerance
+        self._scan_metrics = scan_metrics
+        self.histograms: dict[str, LatencyHistogram] = {}
+
+    def _snapshot(
+        self, region_name: str, region: Region
+    ) -> tuple[np.ndarray, np.ndarray]:
+        image = self._frame_source.grab_regions({region_name: region})[region_name]
+        small = cv2.resize(
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+            None,
+            fx=0.25,
+            fy=0.25,
+            interpolation=cv2.INTER_AREA,
+        )
+        return image, small
+
+    def _differs(self, snapshot: np.ndarray, other: np.ndarray) -> bool:
+        return int(cv2.absdiff(snapshot, other).max()) > self._tolerance
+
+    def perform(
+        self,
+        action: str,
+        command: Callable[[], Any],
+        region_name: str,
+        region: Region,
+        template: Union[str, None] = None,
+    ) -> bool:
+        # Returns whether rendering finished before timing out
+        histogram = self.histograms.setdefault(action, LatencyHistogram())
+        _, before = self._snapshot(region_name, region)
+        command_time = time.perf_counter()
+        command()
+        self._frame_source.advance()
+        start_time = time.perf_counter()
+        timeout, poll_interval = self._timeout, 0.005
+        if histogram.count >= self._warmup:
+            time.sleep(histogram.quantile(0.05) * 0.5)
+            timeout = min(max(histogram.quantile(0.99) * 3.0, 0.5), self._timeout)
+            poll_interval = min(max(histogram.quantile(0.5) / 10.0, 0.002), 0.05)
+        if template is not None and template not in self._template_registry:
+            template = None
+        changed = rendered = False
+        previous = before
+        while time.perf_counter() - start_time < timeout:
+            image, snapshot = self._snapshot(region_name, region)
+            if template is not None and self._template_registry.match(template, image):
+                rendered = True
+                break
+            if changed and not self._differs(snapshot, previous):
+                rendered = True
+                break
+            changed = changed or self._differs(snapshot, before)
+            previous = snapshot
+            time.sleep(poll_interval)
+        elapsed = time.perf_counter() - start_time
+        if rendered:
+            histogram.record(elapsed)
+        if self._scan_metrics is not None:
+            self._scan_metrics.record("navigate", start_time - command_time)
+            self._scan_metrics.record("wait", elapsed)
+        return rendered
+
+    def load(self, path: str) -> None:
+        try:
+            with open(path, encoding="utf-8") as latency_file:
+                self.histograms = {
+                    action: LatencyHistogram(counts)
+                    for action, counts in json.load(latency_file).items()
+                }
+        except (OSError, ValueError):
+            pass
+
+    def save(self, path: str) -> None:
+        with open(path, mode="w", encoding="utf-8") as latency_file:
+            json.dump(
+                {
+                    action: histogram.to_list()
+                    for action, histogram in self.histograms.items()
+                },
+                latency_file,
+            )
+
+
+class PriceStore(object):
+    """Append-only columnar price history, one segment directory per day.
+
+    Every column of a segment is a raw little-endian array file, so ranges
+    are read through memory maps. Item names live once in a string table
+    and rows refer to them by id.
+    """
+
+    _columns: dict[str, Any] = {
+        "item": np.dtype("<u4"),
+        "timestamp": np.dtype("<f8"),
+        "price": np.dtype("<i8"),
+        "quantity": np.dtype("<u4"),
+    }
+    _strings_name = "items.tsv"
+
+    def __init__(self, archive_path: str) -> None:
+        self._archive_path = archive_path
+        self._lock = Lock()
+        self._names: list[str] = []
+        self._ids: dict[str, int] = {}
+        os.makedirs(archive_path, exist_ok=True)
+        strings_path = os.path.join(archive_path, self._strings_name)
+        if os.path.exists(strings_path):
+            with open(strings_path, "rb+") as strings_file:
+                # A torn last line of a crash has no newline yet, it is cut off
+                # so that the next name does not get appended to it
+                length = strings_file.read().rfind(b"\n") + 1
+                strings_file.truncate(length)
+            with open(strings_path, encoding="utf-8") as strings_file:
+                for line in strings_file:
+                    self._intern(line.rstrip("\n"))
+        self._repair_segments()
+
+    def _intern(self, name: str) -> int:
+        item_id = self._ids.get(name)
+        if item_id is None:
+            item_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return item_id
+
+    def _repair_segments(self) -> None:
+        # Columns of a crashed append are truncated back to the shortest one
+        for segment in self.segments():
+            segment_path = os.path.join(self._archive_path, segment)
+            rows = self.count_rows(segment)
+            for column, dtype in self._columns.items():
+                column_path = os.path.join(segment_path, f"{column}.bin")
+                if os.path.getsize(column_path) != rows * dtype.itemsize:
+                    os.truncate(column_path, rows * dtype.itemsize)
+
+    def count_rows(self, segment: str) -> int:
+        segment_path = os.path.join(self._archive_path, segment)
+        return min(
+            (
+                os.path.getsize(os.path.join(segment_path, f"{column}.bin"))
+                // dtype.itemsize
+                if os.path.exists(os.path.join(segment_path, f"{column}.bin"))
+                else 0
+            )
+            for column, dtype in self._columns.items()
+        )
+
+    @property
+    def items_count(self) -> int:
+        return len(self._names)
+
+    def name(self, item_id: int) -> str:
+        return self._names[item_id]
+
+    def item_id(self, name: str) -> Union[int, None]:
+        return self._ids.get(name)
+
+    def segments(self) -> list[str]:
+        return sorted(
+            entry
+            for entry in os.listdir(self._archive_path)
+            if len(entry) == 8
+            and entry.isdigit()
+            and os.path.isdir(os.path.join(self._archive_path, entry))
+        )
+
+    @staticmethod
+    def segment(timestamp: float) -> str:
+        # Segment the rows of `timestamp` are appended to
+        return datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+
+    def append(self, listings: Iterable[Listing], timestamp: float) -> int:
+        listings = list(listings)
+        if not listings:
+            return 0
+        with self._lock:
+            new_names = [
+                listing.name for listing in listings if listing.name not in self._ids
+            ]
+            if new_names:
+                with open(
+                    os.path.join(self._archive_path, self._strings_name),
+                    mode="a",
+                    encoding="utf-8",
+                ) as strings_file:
+                    for name in dict.fromkeys(new_names):
+                        strings_file.write(f"{name}\n")
+                        self._intern(name)
+            segment = self.segment(timestamp)
+            segment_path = os.path.join(self._archive_path, segment)
+            os.makedirs(segment_path, exist_ok=True)
+            arrays = {
+                "item": [self._ids[listing.name] for listing in listings],
+                "timestamp": [timestamp] * len(listings),
+                "price": [listing.price for listing in listings],
+                "quantity": [listing.quantity for listing in listings],
+            }
+            for column, dtype in self._columns.items():
+                with open(
+                    os.path.join(segment_path, f"{column}.bin"), mode="ab"
+                ) as column_file:
+                    column_file.write(np.asarray(arrays[column], dtype=dtype).tobytes())
+        return len(listings)
+
+    def read(self, segment: str) -> dict[str, np.ndarray]:
+        rows = self.count_rows(segment)
+        segment_path = os.path.join(self._archive_path, segment)
+        return {
+            column: (
+                np.memmap(
+                    os.path.join(segment_path, f"{column}.bin"),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(rows,),
+                )
+                if rows
+                else np.zeros(0, dtype=dtype)
+            )
+            for column, dtype in self._columns.items()
+        }
+
+    def read_range(
+        self, start_time: float, end_time: float
+    ) -> Iterable[dict[str, np.ndarray]]:
+        # Yields the rows of every segment inside [start_time, end_time)
+        first_segment = datetime.fromtimestamp(start_time).strftime("%Y%m%d")
+        last_segment = datetime.fromtimestamp(end_time).strftime("%Y%m%d")
+        for segment in self.segments():
+            if not first_segment <= segment <= last_segment:
+                continue
+            columns = self.read(segment)
+            # Rows are appended in time order, timestamps are sorted
+            start, end = np.searchsorted(columns["timestamp"], [start_time, end_time])
+            if end > start:
+                yield {column: array[start:end] for column, array in columns.items()}
+
+
+class PriceIndex(object):
+    """Per-item index of the price store for binary-searched range queries.
+
+    Every segment keeps sorted runs of (item, timestamp, offset) postings in
+    column files, one run appended per update and all runs merged once there
+    are too many. Rows not indexed yet, e.g. after a crash, are indexed by
+    the next update and scanned directly until then.
+    """
+
+    _columns: dict[str, Any] = {
+        "item": np.dtype("<u4"),
+        "timestamp": np.dtype("<f8"),
+        "offset": np.dtype("<u4"),
+    }
+    _max_runs = 16
+
+    def __init__(self, price_store: PriceStore, archive_path: str) -> None:
+        self._price_store = price_store
+        self._archive_path = archive_path
+        self._lock = Lock()
+        self._runs: dict[str, list[int]] = {}
+        for segment in price_store.segments():
+            self._recover(segment)
+
+    def _path(self, segment: str, name: str) -> str:
+        return os.path.join(self._archive_path, segment, f"index-{name}.bin")
+
+    def _recover(self, segment: str) -> None:
+        # Run ends are the commit points, postings past the last one are torn
+        runs_path = self._path(segment, "runs")
+        runs: list[int] = []
+        if os.path.exists(runs_path):
+            runs = np.fromfile(runs_path, dtype="<u8").tolist()
+        indexed = runs[-1] if runs else 0
+        if any(
+            not os.path.exists(self._path(segment, column))
+            or os.path.getsize(self._path(segment, column)) < indexed * dtype.itemsize
+            for column, dtype in self._columns.items()
+        ):
+            runs, indexed = [], 0
+        for column, dtype in self._columns.items():
+            if os.path.exists(self._path(segment, column)):
+                os.truncate(self._path(segment, column), indexed * dtype.itemsize)
+        with open(runs_path, mode="wb") as runs_file:
+            runs_file.write(np.asarray(runs, dtype="<u8").tobytes())
+        self._runs[segment] = runs
+
+    def update(self) -> int:
+        # Returns the number of newly indexed rows
+        rows_count = 0
+        with self._lock:
+            for segment in self._price_store.segments():
+                runs = self._runs.setdefault(segment, [])
+                indexed = runs[-1] if runs else 0
+                rows = self._price_store.count_rows(segment)
+                if rows <= indexed:
+                    continue
+                columns = self._price_store.read(segment)
+                order = np.argsort(columns["item"][indexed:rows], kind="stable")
+                postings = {
+                    "item": columns["item"][indexed:rows][order],
+                    "timestamp": columns["timestamp"][indexed:rows][order],
+                    "offset": order + indexed,
+                }
+                for column, dtype in self._columns.items():
+                    with open(self._path(segment, column), mode="ab") as column_file:
+                        column_file.write(postings[column].astype(dtype).tobytes())
+                with open(self._path(segment, "runs"), mode="ab") as runs_file:
+                    runs_file.write(np.asarray([rows], dtype="<u8").tobytes())
+                runs.append(rows)
+                rows_count += rows - indexed
+                if len(runs) > self._max_runs:
+                    self._compact(segment)
+        return rows_count
+
+    def _compact(self, segment: str) -> None:
+        # Stable merge keeps postings of an item in time order
+        rows = self._runs[segment][-1]
+        # Read into memory, a mapped file cannot be replaced on Windows
+        postings = {
+            column: np.array(array)
+            for column, array in self._read(segment, rows).items()
+        }
+        order = np.argsort(postings["item"], kind="stable")
+        for column, dtype in self._columns.items():
+            column_path = self._path(segment, column)
+            with open(f"{column_path}.tmp", mode="wb") as column_file:
+                column_file.write(
+                    np.asarray(postings[column][order], dtype=dtype).tobytes()
+                )
+            os.replace(f"{column_path}.tmp", column_path)
+        # Slices of merged postings are still sorted, so a crash before the
+        # runs file is replaced leaves a valid index behind
+        runs_path = self._path(segment, "runs")
+        with open(f"{runs_path}.tmp", mode="wb") as runs_file:
+            runs_file.write(np.asarray([rows], dtype="<u8").tobytes())
+        os.replace(f"{runs_path}.tmp", runs_path)
+        self._runs[segment] = [rows]
+
+    def _read(self, segment: str, rows: int) -> dict[str, np.ndarray]:
+        return {
+            column: np.memmap(
+                self._path(segment, column), dtype=dtype, mode="r", shape=(rows,)
+            )
+            for column, dtype in self._columns.items()
+        }
+
+    def _lookup(
+        self,
+        segment: str,
+        runs: list[int],
+        item_id: int,
+        start_time: float,
+        end_time: float,
+    ) -> list[np.ndarray]:
+        # Indexed offsets of an item per run, copied out of the mapped files
+        offsets: list[np.ndarray] = []
+        if not runs:
+            return offsets
+        postings = self._read(segment, runs[-1])
+        for run_start, run_end in zip([0, *runs[:-1]], runs):
+            items = postings["item"][run_start:run_end]
+            low, high = np.searchsorted(items, [item_id, item_id + 1])
+            timestamps = postings["timestamp"][run_start + low : run_start + high]
+            start, end = np.searchsorted(timestamps, [start_time, end_time])
+            offsets.append(
+                np.array(
+                    postings["offset"][run_start + low + start : run_start + low + end]
+                )
+            )
+        return offsets
+
+    def query(
+        self, item_id: int, start_time: float, end_time: float
+    ) -> dict[str, np.ndarray]:
+        # Stored columns of all rows of an item inside [start_time, end_time)
+        segments = self._price_store.segments()
+        first = bisect.bisect_left(
+            segments, datetime.fromtimestamp(start_time).strftime("%Y%m%d")
+        )
+        last = bisect.bisect_right(
+            segments, datetime.fromtimestamp(end_time).strftime("%Y%m%d")
+        )
+        results: list[dict[str, np.ndarray]] = []
+        for segment in segments[first:last]:
+            # Index files are mapped only while compaction cannot replace them
+            with self._lock:
+                runs = list(self._runs.get(segment, []))
+                offsets = self._lookup(segment, runs, item_id, start_time, end_time)
+            indexed = runs[-1] if runs else 0
+            columns = self._price_store.read(segment)
+            # Tail appended after the last update is small, scan it directly
+            tail = np.flatnonzero(columns["item"][indexed:] == item_id) + indexed
+            tail_timestamps = columns["timestamp"][tail]
+            offsets.append(
+                tail[(tail_timestamps >= start_time) & (tail_timestamps < end_time)]
+            )
+            rows = np.sort(np.concatenate(offsets).astype(np.int64))
+            results.append({column: array[rows] for column, array in columns.items()})
+        return {
+            column: (
+                np.concatenate([result[column] for result in results])
+                if results
+                else np.zeros(0, dtype=dtype)
+            )
+            for column, dtype in PriceStore._columns.items()
+        }
+
+
+def iter_price_rows(
+    price_store: PriceStore,
+    start_time: float,
+    end_time: float,
+    chunk_size: int = 65536,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    # Chunked so that a long history is never materialized as Python objects
+    for columns in price_store.read_range(start_time, end_time):
+        for offset in range(0, len(columns["item"]), chunk_size):
+            for item_id, timestamp, price, quantity in zip(
+                columns["item"][offset : offset + chunk_size].tolist(),
+                columns["timestamp"][offset : offset + chunk_size].tolist(),
+                columns["price"][offset : offset + chunk_size].tolist(),
+                columns["quantity"][offset : offset + chunk_size].tolist(),
+            ):
+                yield (
+                    datetime.fromtimestamp(timestamp),
+                    price_store.name(item_id),
+                    price,
+                    quantity,
+                )
+
+
+def export_xlsx(xlsx_path: str, rows: Iterable[tuple[datetime, str, int, int]]) -> int:
+    # Constant memory mode flushes every row as soon as the next one starts
+    workbook = xlsxwriter.Workbook(xlsx_path, {"constant_memory": True})
+    time_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    worksheet = None
+    sheet_row = rows_count = 0
+    for timestamp, name, price, quantity in rows:
+        if worksheet is None or sheet_row == 1048575:
+            worksheet = workbook.add_worksheet(f"价格{len(workbook.worksheets()) + 1}")
+            worksheet.write_row(0, 0, ["时间", "物品", "价格", "数量"])
+            sheet_row = 0
+        sheet_row += 1
+        rows_count += 1
+        worksheet.write_datetime(sheet_row, 0, timestamp, time_format)
+        worksheet.write_row(sheet_row, 1, [name, price, quantity])
+    workbook.close()
+    return rows_count
+
+
+class PriceAggregates(object):
+    """Per-item price aggregates, updated only with rows not seen before.
+
+    Medians come from log-spaced price histograms, precise to a few percents,
+    and a watermark of consumed rows is kept for every segment.
+    """
+
+    _bounds = np.geomspace(1.0, 1e10, 257)
+
+    def __init__(self, aggregates_path: str) -> None:
+        self._aggregates_path = aggregates_path
+        self._watermarks: dict[str, int] = {}
+        self._count = np.zeros(0, dtype=np.int64)
+        self._min = np.zeros(0, dtype=np.int64)
+        self._last_price = np.zeros(0, dtype=np.int64)
+        self._last_time = np.zeros(0, dtype=np.float64)
+        self._histogram = np.zeros((0, self._bounds.size + 1), dtype=np.int32)
+        try:
+            with np.load(aggregates_path) as aggregates:
+                self._watermarks = json.loads(str(aggregates["watermarks"]))
+                self._count = aggregates["count"]
+                self._min = aggregates["min"]
+                self._last_price = aggregates["last_price"]
+                self._last_time = aggregates["last_time"]
+                self._histogram = aggregates["histogram"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _grow(self, items_count: int) -> None:
+        extra = items_count - self._count.size
+        if extra <= 0:
+            return
+        self._count = np.concatenate((self._count, np.zeros(extra, dtype=np.int64)))
+        self._min = np.concatenate(
+            (self._min, np.full(extra, np.iinfo(np.int64).max, dtype=np.int64))
+        )
+        self._last_price = np.concatenate(
+            (self._last_price, np.zeros(extra, dtype=np.int64))
+        )
+        self._last_time = np.concatenate(
+            (self._last_time, np.zeros(extra, dtype=np.float64))
+        )
+        self._histogram = np.concatenate(
+            (
+                self._histogram,
+                np.zeros((extra, self._histogram.shape[1]), dtype=np.int32),
+            )
+        )
+
+    def update(self, price_store: PriceStore) -> int:
+        # Returns the number of newly aggregated rows
+        rows_count = 0
+        for segment in price_store.segments():
+            watermark = self._watermarks.get(segment, 0)
+            if price_store.count_rows(segment) <= watermark:
+                continue
+            columns = price_store.read(segment)
+            items = columns["item"][watermark:].astype(np.int64)
+            prices = np.asarray(columns["price"][watermark:])
+            timestamps = np.asarray(columns["timestamp"][watermark:])
+            if items.size == 0:
+                continue
+            # Sized by the rows read, names may be interned meanwhile
+            self._grow(int(items.max()) + 1)
+            self._count += np.bincount(items, minlength=self._count.size)
+            np.minimum.at(self._min, items, prices)
+            np.add.at(
+                self._histogram,
+                (items, np.searchsorted(self._bounds, prices)),
+                1,
+            )
+            # Rows are in time order, the last occurrence holds the last price
+            unique_items, reversed_indices = np.unique(items[::-1], return_index=True)
+            last_indices = items.size - 1 - reversed_indices
+            self._last_price[unique_items] = prices[last_indices]
+            self._last_time[unique_items] = timestamps[last_indices]
+            self._watermarks[segment] = watermark + items.size
+            rows_count += items.size
+        return rows_count
+
+    def save(self) -> None:
+        with open(f"{self._aggregates_path}.tmp", mode="wb") as aggregates_file:
+            np.savez(
+                aggregates_file,
+                watermarks=np.array(json.dumps(self._watermarks)),
+                count=self._count,
+                min=self._min,
+                last_price=self._last_price,
+                last_time=self._last_time,
+                histogram=self._histogram,
+            )
+        os.replace(f"{self._aggregates_path}.tmp", self._aggregates_path)
+
+    def medians(self) -> np.ndarray:
+        cumulative = np.cumsum(self._histogram, axis=1)
+        buckets = np.argmax(cumulative * 2 >= cumulative[:, -1:], axis=1)
+        # Geometric center of the bucket, clamped to the observed minimum
+        lower = self._bounds[np.clip(buckets - 1, 0, self._bounds.size - 1)]
+        upper = self._bounds[np.clip(buckets, 0, self._bounds.size - 1)]
+        return np.maximum(np.sqrt(lower * upper), self._min).astype(np.int64)
+
+    def table(self, price_store: PriceStore) -> list[tuple[Any, ...]]:
+        # Rows of (name, min, median, last, trend, count), sorted by name
+        medians = self.medians()
+        return sorted(
+            (
+                price_store.name(item_id),
+                int(self._min[item_id]),
+                int(medians[item_id]),
+                int(self._last_price[item_id]),
+                f"{(self._last_price[item_id] / max(medians[item_id], 1) - 1) * 100:+.1f}%",
+                int(self._count[item_id]),
+            )
+            for item_id in np.flatnonzero(self._count).tolist()
+        )
+
+
+class ScanHistory(object):
+    """Top page snapshots and staleness budgets of every category.
+
+    A category is paged through only when its top page changed since the last
+    sample or its budget ran out. Budgets halve when a sample shows changes
+    and double otherwise, so volatile categories are revisited more often.
+    """
+
+    def __init__(self, state_path: str, min_budget: float, max_budget: float) -> None:
+        self._state_path = state_path
+        self._min_budget = min_budget
+        self._max_budget = max_budget
+        self._states: dict[str, dict[str, Any]] = {}
+        try:
+            with open(state_path, encoding="utf-8") as state_file:
+                self._states = json.load(state_file)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def snapshot(listings: Iterable[Listing]) -> str:
+        return hashlib.blake2b(
+            repr(tuple(listings)).encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def _state(self, category: str) -> dict[str, Any]:
+        return self._states.setdefault(
+            category, {"snapshot": "", "scanned": 0.0, "budget": self._min_budget}
+        )
+
+    def budget(self, category: str) -> float:
+        return self._state(category)["budget"]
+
+    def sample(self, category: str, snapshot: str, timestamp: float) -> bool:
+        # Returns whether the category needs to be paged through
+        state = self._state(category)
+        changed = state["snapshot"] != snapshot
+        state["snapshot"] = snapshot
+        budget = state["budget"] / 2 if changed else state["budget"] * 2
+        state["budget"] = min(max(budget, self._min_budget), self._max_budget)
+        return changed or timestamp - state["scanned"] >= state["budget"]
+
+    def volatility(self, category: str) -> float:
+        # One for categories changing at every sample, towards zero otherwise
+        return self._min_budget / self.budget(category)
+
+    def mark_scanned(self, category: str, timestamp: float) -> None:
+        self._state(category)["scanned"] = timestamp
+
+    def save(self) -> None:
+        with open(f"{self._state_path}.tmp", mode="w", encoding="utf-8") as state_file:
+            json.dump(self._states, state_file, ensure_ascii=False)
+        os.replace(f"{self._state_path}.tmp", self._state_path)
+
+
+class ScanJob(NamedTuple):
+    category: str
+    # Whole category when unset
+    item: Union[str, None] = None
+
+
+class ScanCheckpoint(object):
+    """Position of the scan job in progress, saved as pages are persisted.
+
+    The page is the next one to capture and the cursor is the snapshot of
+    the last stored page, which tells on resume whether the listings moved.
+    Rows are the segment and row range that page is stored at, saved before
+    the page is appended, so a resumed page never stores its rows twice.
+    A job is cleared once its last submitted page is persisted.
+    """
+
+    def __init__(self, state_path: str) -> None:
+        self._state_path = state_path
+        self._lock = Lock()
+        self.job: Union[ScanJob, None] = None
+        self.page = 0
+        self.cursor: Union[str, None] = None
+        self.rows: Union[tuple[str, int, int], None] = None
+        self._end_page: Union[int, None] = None
+        try:
+            with open(state_path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            if state["category"] is not None:
+                self.job = ScanJob(state["category"], state["item"])
+                self.page, self.cursor = state["page"], state["cursor"]
+                if state.get("rows") is not None:
+                    segment, start, end = state["rows"]
+                    self.rows = (segment, start, end)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def begin(
+        self,
+        job: ScanJob,
+        page: int = 0,
+        cursor: Union[str, None] = None,
+        rows: Union[tuple[str, int, int], None] = None,
+    ) -> None:
+        with self._lock:
+            self.job, self.page, self.cursor, self.rows = job, page, cursor, rows
+            self._end_page = None
+            self._save()
+
+    def advance(
+        self, job: ScanJob, page: int, cursor: str, rows: tuple[str, int, int]
+    ) -> None:
+        # Pages of a finished job persisted late are ignored
+        with self._lock:
+            if job != self.job:
+                return
+            self.page, self.cursor, self.rows = page + 1, cursor, rows
+            if self._end_page is not None and self.page >= self._end_page:
+                self.job = None
+            self._save()
+
+    def finish(self, job: ScanJob, pages_count: int) -> None:
+        # Cleared now or when the last of `pages_count` pages is persisted
+        with self._lock:
+            if job != self.job:
+                return
+            if self.page >= pages_count:
+                self.job = None
+                self._save()
+            else:
+                self._end_page = pages_count
+
+    def clear(self) -> None:
+        with self._lock:
+            self.job = None
+            self._save()
+
+    def _save(self) -> None:
+        state = {
+            "category": self.job.category if self.job is not None else None,
+            "item": self.job.item if self.job is not None else None,
+            "page": self.page,
+            "cursor": self.cursor,
+            "rows": self.rows,
+        }
+        with open(f"{self._state_path}.tmp", mode="w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, ensure_ascii=False)
+        os.replace(f"{self._state_path}.tmp", self._state_path)
+
+
+class ScanScheduler(object):
+    """Priority queue of scan jobs, planned into fixed time windows.
+
+    Priorities grow with the time since a job last ran and are weighted by
+    price volatility and watchlist boosts, which halve every `boost_half_life`
+    seconds. Every window takes the jobs with the most priority per estimated
+    second until its budget is spent.
+    """
+
+    def __init__(
+        self,
+        volatility: Callable[[ScanJob], float],
+        default_duration: float = 60.0,
+        boost_half_life: float = 3600.0,
+    ) -> None:
+        self._volatility = volatility
+        self._default_duration = default_duration
+        self._boost_half_life = boost_half_life
+        self._jobs: dict[ScanJob, None] = {}
+        self._boosts: dict[ScanJob, tuple[float, float]] = {}
+        self._last_runs: dict[ScanJob, float] = {}
+        self._durations: dict[ScanJob, float] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __contains__(self, job: ScanJob) -> bool:
+        return job in self._jobs
+
+    def __iter__(self) -> Iterator[ScanJob]:
+        # Jobs in the order they were added
+        with self._lock:
+            return iter(list(self._jobs))
+
+    def add(self, job: ScanJob) -> None:
+        with self._lock:
+            self._jobs[job] = None
+
+    def remove(self, job: ScanJob) -> None:
+        with self._lock:
+            self._jobs.pop(job, None)
+            self._boosts.pop(job, None)
+
+    def clear(self) -> None:
+        # Boosts are kept for jobs added back later
+        with self._lock:
+            self._jobs.clear()
+
+    def boost(self, job: ScanJob, weight: float, timestamp: float) -> None:
+        with self._lock:
+            self._boosts[job] = (weight, timestamp)
+
+    def _boost(self, job: ScanJob, timestamp: float) -> float:
+        weight, boost_time = self._boosts.get(job, (0.0, timestamp))
+        return weight * 0.5 ** (
+            max(timestamp - boost_time, 0.0) / self._boost_half_life
+        )
+
+    def estimate(self, job: ScanJob) -> float:
+        return self._durations.get(job, self._default_duration)
+
+    def priority(self, job: ScanJob, timestamp: float) -> float:
+        # Jobs never run count as waiting for a whole day
+        waited_hours = (timestamp - self._last_runs.get(job, timestamp - 86400)) / 3600
+        return (
+            (1.0 + waited_hours)
+            * (1.0 + self._volatility(job))
+            * (1.0 + self._boost(job, timestamp))
+        )
+
+    def plan(self, timestamp: float, budget: float) -> list[ScanJob]:
+        with self._lock:
+            # Boosts decayed to nothing are forgotten
+            for job in [
+                job for job in self._boosts if self._boost(job, timestamp) < 0.01
+            ]:
+                del self._boosts[job]
+            heap = [
+                (-self.priority(job, timestamp) / max(self.estimate(job), 1.0), job)
+                for job in self._jobs
+            ]
+        heapq.heapify(heap)
+        jobs: list[ScanJob] = []
+        while heap:
+            _, job = heapq.heappop(heap)
+            # Smaller jobs may still fit after a bigger one is passed over
+            if self.estimate(job) <= budget or not jobs:
+                jobs.append(job)
+                budget -= self.estimate(job)
+        return jobs
+
+    def record(self, job: ScanJob, timestamp: float, duration: float) -> None:
+        with self._lock:
+            self._last_runs[job] = timestamp
+            previous = self._durations.get(job)
+            self._durations[job] = (
+                duration if previous is None else previous * 0.7 + duration * 0.3
+            )
+
+
+class WatchRule(NamedTuple):
+    name: str
+    buy_price: Union[int, None]
+    sell_price: Union[int, None]
+
+
+class Watchlist(object):
+    """Buy and sell thresholds of watched items, keyed by normalized name.
+
+    Rules are compiled once into a dict, so checking a row costs one lookup
+    however many rules are watched.
+    """
+
+    def __init__(self, rules: Iterable[WatchRule]) -> None:
+        self._rules = {normalize_name(rule.name): rule for rule in rules}
+
+    @classmethod
+    def from_config(cls, section: Mapping[str, str]) -> "Watchlist":
+        # Options read like `物品名 = 买入价,卖出价`, either price may be left empty
+        rules: list[WatchRule] = []
+        for name, value in section.items():
+            buy_text, _, sell_text = value.partition(",")
+            rules.append(
+                WatchRule(
+                    name, parse_price(buy_text.strip()), parse_price(sell_text.strip())
+                )
+            )
+        return cls(rules)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def __iter__(self) -> Iterator[WatchRule]:
+        return iter(self._rules.values())
+
+    def check(self, listing: Listing) -> Union[tuple[WatchRule, str], None]:
+        # Returns the matched rule and whether to buy or to sell
+        rule = self._rules.get(normalize_name(listing.name))
+        if rule is None:
+            return None
+        if rule.buy_price is not None and listing.price <= rule.buy_price:
+            return rule, "买入"
+        if rule.sell_price is not None and listing.price >= rule.sell_price:
+            return rule, "卖出"
+        return None
+
+
+class HistoryTable(object):
+    """Random access to stored rows, newest first, read lazily by pages."""
+
+    def __init__(
+        self,
+        price_store: PriceStore,
+        page_size: int = 256,
+        cached_pages: int = 16,
+    ) -> None:
+        self._price_store = price_store
+        self._page_size = page_size
+        self._cached_pages = cached_pages
+        self._pages: OrderedDict[int, list[tuple[Any, ...]]] = OrderedDict()
+        # Only file sizes are needed, opening a year costs as much as a day
+        self._segments = price_store.segments()[::-1]
+        self._ends = np.cumsum(
+            [price_store.count_rows(segment) for segment in self._segments],
+            dtype=np.int64,
+        )
+
+    def __len__(self) -> int:
+        return int(self._ends[-1]) if self._ends.size else 0
+
+    def rows(self, start: int, stop: int) -> list[tuple[Any, ...]]:
+        rows: list[tuple[Any, ...]] = []
+        for page_index in range(start // self._page_size, -(-stop // self._page_size)):
+            page = self._pages.get(page_index)
+            if page is None:
+                page = self._pages[page_index] = self._load(page_index)
+                while len(self._pages) > self._cached_pages:
+                    self._pages.popitem(last=False)
+            else:
+                self._pages.move_to_end(page_index)
+            page_start = page_index * self._page_size
+            rows.extend(page[max(start - page_start, 0) : max(stop - page_start, 0)])
+        return rows
+
+    def _load(self, page_index: int) -> list[tuple[Any, ...]]:
+        rows: list[tuple[Any, ...]] = []
+        start = page_index * self._page_size
+        stop = min(start + self._page_size, len(self))
+        while start < stop:
+            segment_index = int(np.searchsorted(self._ends, start, side="right"))
+            segment_begin = int(self._ends[segment_index - 1]) if segment_index else 0
+            segment_end = int(self._ends[segment_index])
+            columns = self._price_store.read(self._segments[segment_index])
+            # Newest first, the first row of a segment is its last stored one
+            indices = (
+                segment_end
+                - segment_begin
+                - 1
+                - np.arange(
+                    start - segment_begin, min(stop, segment_end) - segment_begin
+                )
+            )
+            for item_id, timestamp, price, quantity in zip(
+                columns["item"][indices].tolist(),
+                columns["timestamp"][indices].tolist(),
+                columns["price"][indices].tolist(),
+                columns["quantity"][indices].tolist(),
+            ):
+                rows.append(
+                    (
+                        datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M"),
+                        self._price_store.name(item_id),
+                        price,
+                        quantity,
+                    )
+                )
+            start = min(stop, segment_end)
+        return rows
+
+
+class HistoryViewer(object):
+    """Window over the archive, widgets exist only for the visible rows."""
+
+    _visible_rows = 12
+    _columns = {
+        "汇总": (
+            ("物品", 0.28),
+            ("最低", 0.14),
+            ("中位", 0.14),
+            ("最新", 0.14),
+            ("趋势", 0.14),
+            ("次数", 0.12),
+        ),
+        "明细": (
+            ("时间", 0.28),
+            ("物品", 0.38),
+            ("价格", 0.16),
+            ("数量", 0.14),
+        ),
+    }
+
+    def __init__(
+        self,
+        master: "CTk",
+        summary: list[tuple[Any, ...]],
+        history: HistoryTable,
+        item_history: Callable[[str], list[tuple[Any, ...]]],
+    ) -> None:
+        self._sources: dict[str, tuple[int, Callable[[int, int], list[Any]]]] = {
+            "汇总": (len(summary), lambda start, stop: summary[start:stop]),
+            "明细": (len(history), history.rows),
+        }
+        self._history = history
+        self._item_history = item_history
+        self._mode = "汇总"
+        self._offset = 0
+        self._ctk_toplevel = CTkToplevel(master=master)
+        self._ctk_toplevel.wm_title("查看存档")
+        self._ctk_toplevel.wm_geometry(
+            f"640x360+{master.winfo_x() + 40}+{master.winfo_y() + 40}"
+        )
+        self._ctk_toplevel.bind("<MouseWheel>", self._wheel)
+        self._ctk_segmentedbutton_mode = CTkSegmentedButton(
+            master=self._ctk_toplevel,
+            values=list(self._columns),
+            command=self._change_mode,
+        )
+        self._ctk_segmentedbutton_mode.place_configure(
+            relwidth=0.3,
+            relheight=0.08,
+            relx=0.35,
+            rely=0.01,
+        )
+        self._ctk_label_count = CTkLabel(master=self._ctk_toplevel, text="")
+        self._ctk_label_count.place_configure(
+            relwidth=0.3,
+            relheight=0.08,
+            relx=0.68,
+            rely=0.01,
+        )
+        columns_count = max(map(len, self._columns.values()))
+        self._ctk_labels_header = [
+            CTkLabel(master=self._ctk_toplevel, text="") for _ in range(columns_count)
+        ]
+        self._ctk_labels_cells = [
+            [CTkLabel(master=self._ctk_toplevel, text="") for _ in range(columns_count)]
+            for _ in range(self._visible_rows)
+        ]
+        for row_index, ctk_labels_row in enumerate(self._ctk_labels_cells):
+            for ctk_label_cell in ctk_labels_row:
+                ctk_label_cell.bind(
+                    "<Button-1>",
+                    lambda _, row_index=row_index: self._select_item(row_index),
+                )
+        self._ctk_scrollbar = CTkScrollbar(
+            master=self._ctk_toplevel, command=self._scroll
+        )
+        self._ctk_scrollbar.place_configure(
+            relwidth=0.03,
+            relheight=0.88,
+            relx=0.97,
+            rely=0.1,
+        )
+        self._ctk_segmentedbutton_mode.set(self._mode)
+        self._change_mode(self._mode)
+
+    def exists(self) -> bool:
+        return bool(self._ctk_toplevel.winfo_exists())
+
+    def destroy(self) -> None:
+        self._ctk_toplevel.destroy()
+
+    def _select_item(self, row_index: int) -> None:
+        # Clicking an item of the summary shows its own history
+        if self._mode != "汇总":
+            return
+        rows = self._sources["汇总"][1](
+            self._offset + row_index, self._offset + row_index + 1
+        )
+        if not rows:
+            return
+        item_rows = self._item_history(rows[0][0])
+        self._sources["明细"] = (
+            len(item_rows),
+            lambda start, stop: item_rows[start:stop],
+        )
+        self._ctk_segmentedbutton_mode.set("明细")
+        self._layout("明细")
+        self._ctk_label_count.configure(text=f"{rows[0][0]}共{len(item_rows)}条")
+
+    def _change_mode(self, value: str) -> None:
+        if value == "明细":
+            self._sources["明细"] = (len(self._history), self._history.rows)
+        self._layout(value)
+
+    def _layout(self, value: str) -> None:
+        self._mode = value
+        self._offset = 0
+        row_height = 0.88 / (self._visible_rows + 1)
+        relx = 0.0
+        for column_index, ctk_label_header in enumerate(self._ctk_labels_header):
+            ctk_labels_column = [
+                cells[column_index] for cells in self._ctk_labels_cells
+            ]
+            if column_index >= len(self._columns[value]):
+                ctk_label_header.place_forget()
+                for ctk_label_cell in ctk_labels_column:
+                    ctk_label_cell.place_forget()
+                continue
+            text, relwidth = self._columns[value][column_index]
+            ctk_label_header.configure(text=text)
+            ctk_label_header.place_configure(
+                relwidth=relwidth * 0.97,
+                relheight=row_height,
+                relx=relx,
+                rely=0.1,
+            )
+            for row_index, ctk_label_cell in enumerate(ctk_labels_column):
+                ctk_label_cell.place_configure(
+                    relwidth=relwidth * 0.97,
+                    relheight=row_height,
+                    relx=relx,
+                    rely=0.1 + row_height * (row_index + 1),
+                )
+            relx += relwidth * 0.97
+        self._ctk_label_count.configure(text=f"共{self._sources[value][0]}条")
+        self._refresh()
+
+    def _scroll(
+        self, action: str, value: Union[str, float], unit: str = "units"
+    ) -> None:
+        # Protocol of Tk scrollbars, either `moveto` or `scroll`
+        rows_count = self._sources[self._mode][0]
+        if action == "moveto":
+            self._offset = int(float(value) * rows_count)
+        else:
+            self._offset += int(value) * (self._visible_rows if unit == "pages" else 1)
+        self._refresh()
+
+    def _wheel(self, event: Any) -> None:
+        self._scroll("scroll", -3 if event.delta > 0 else 3)
+
+    def _refresh(self) -> None:
+        rows_count, fetch = self._sources[self._mode]
+        self._offset = max(min(self._offset, rows_count - self._visible_rows), 0)
+        rows = fetch(self._offset, self._offset + self._visible_rows)
+        for row_index, ctk_labels_row in enumerate(self._ctk_labels_cells):
+            row = rows[row_index] if row_index < len(rows) else ()
+            for column_index, ctk_label_cell in enumerate(ctk_labels_row):
+                ctk_label_cell.configure(
+                    text=str(row[column_index]) if column_index < len(row) else ""
+                )
+        if rows_count:
+            self._ctk_scrollbar.set(
+                self._offset / rows_count,
+                min(self._offset + self._visible_rows, rows_count) / rows_count,
+            )
+        else:
+            self._ctk_scrollbar.set(0.0, 1.0)
+
+
+class PageCapture(NamedTuple):
+    category: str
+    page: int
+    timestamp: float
+    frames: dict[str, np.ndarray]
+    shared_frames: Union[SharedFrames, None] = None
+    job: Union[ScanJob, None] = None
+    # Rows stored from this page before resuming, see `ScanCheckpoint`
+    stored_rows: Union[tuple[str, int, int], None] = None
+
+
+class ScanPipeline(object):
+    """Capture, recognition and persistence stages joined by bounded queues.
+
+    The caller drives the UI and submits captured pages, recognition runs on
+    a worker pool and one thread persists the results in submission order.
+    Submitting blocks once `depth` pages are in flight, bounding memory.
+    """
+
+    def __init__(
+        self,
+        recognize: Callable[[PageCapture], list[Listing]],
+        persist: Callable[[PageCapture, list[Listing]], None],
+        on_error: Callable[[PageCapture, Exception], None],
+        workers: int = 2,
+        depth: int = 4,
+    ) -> None:
+        self._recognize = recognize
+        self._persist = persist
+        self._on_error = on_error
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="recognize"
+        )
+        self._pending: Queue[
+            Union[tuple[PageCapture, Future[list[Listing]]], None]
+        ] = Queue(maxsize=depth)
+        self._persister = Thread(target=self._run, daemon=True)
+        self._persister.start()
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending.qsize()
+
+    def submit(self, capture: PageCapture) -> None:
+        self._pending.put((capture, self._executor.submit(self._recognize, capture)))
+
+    def _run(self) -> None:
+        while (job := self._pending.get()) is not None:
+            capture, future = job
+            try:
+                self._persist(capture, future.result())
+            except Exception as stage_error:
+                self._on_error(capture, stage_error)
+            finally:
+                self._pending.task_done()
+
+    def join(self) -> None:
+        # Waits until every submitted page has been persisted
+        self._pending.join()
+
+    def close(self) -> None:
+        self._pending.put(None)
+        self._persister.join()
+        self._executor.shutdown()
+
+
+class GuiBridge(object):
+    """Widget states posted by any thread, applied by the Tk thread.
+
+    Posting only keeps the latest value of a key, so bursts of updates are
+    coalesced into one widget call per frame. Tickers run on every frame.
+    Errors are reported to `on_error` and never stop the frames.
+    """
+
+    def __init__(
+        self,
+        window: Any,
+        on_error: Callable[[Exception], None],
+        frame_rate: float = 20.0,
+    ) -> None:
+        self._window = window
+        self._on_error = on_error
+        self._frame_interval = round(1000 / frame_rate)
+        self._appliers: dict[str, Callable[[Any], None]] = {}
+        self._tickers: list[Callable[[], None]] = []
+        self._pending: dict[str, Any] = {}
+        self._lock = Lock()
+
+    def register(self, key: str, apply: Callable[[Any], None]) -> None:
+        self._appliers[key] = apply
+
+    def add_ticker(self, tick: Callable[[], None]) -> None:
+        self._tickers.append(tick)
+
+    def post(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._pending[key] = value
+
+    def start(self) -> None:
+        self._window.after(self._frame_interval, self._apply)
+
+    def _apply(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            for key, value in pending.items():
+                self._call(self._appliers[key], value)
+            for tick in self._tickers:
+                self._call(tick)
+        finally:
+            self._window.after(self._frame_interval, self._apply)
+
+    def _call(self, function: Callable[..., None], *args: Any) -> None:
+        try:
+            function(*args)
+        except Exception as gui_error:
+            self._on_error(gui_error)
+
+
+class LogSink(object):
+    """Log records queued by any thread and written out in batches.
+
+    One thread writes records to the console and the log file, flushing
+    every `flush_interval` seconds or `batch_size` records. Records shown by
+    the GUI wait in a second queue until the Tk thread drains them.
+    """
+
+    _prefixes = {
+        "warning": ("[警告]", "[错误]"),
+        "error": ("[错误]",),
+    }
+
+    def __init__(
+        self,
+        flush_interval: float = 0.2,
+        batch_size: int = 256,
+        displayed: bool = True,
+    ) -> None:
+        self.level = "info"
+        self._displayed = displayed
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._log_file: Union[TextIO, None] = None
+        self._log_file_lock = Lock()
+        self._records: Queue[Union[str, None]] = Queue()
+        self._displayed_records: Queue[str] = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def open(self, log_file_path: Union[str, None]) -> None:
+        with self._log_file_lock:
+            if self._log_file is not None:
+                self._log_file.close()
+            self._log_file = (
+                None
+                if log_file_path is None
+                else open(log_file_path, mode="a+", encoding="utf-8")
+            )
+
+    @property
+    def pending_count(self) -> int:
+        return self._records.qsize()
+
+    def put(self, text: str) -> None:
+        record = f"{datetime.now().time()} {text}\n"
+        self._records.put(record)
+        if self._displayed:
+            self._displayed_records.put(record)
+
+    def drain(self, limit: int) -> list[str]:
+        records: list[str] = []
+        while len(records) < limit:
+            try:
+                records.append(self._displayed_records.get_nowait())
+            except Empty:
+                break
+        return records
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._records.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size and None not in batch:
+                try:
+                    batch.append(self._records.get(timeout=deadline - time.monotonic()))
+                except (Empty, ValueError):
+                    break
+            if None in batch:
+                self._write(batch[: batch.index(None)])
+                return
+            self._write(batch)
+
+    def _write(self, records: list[str]) -> None:
+        # Console is missing from windowed builds
+        if sys.stdout is not None:
+            sys.stdout.write("".join(records))
+        with self._log_file_lock:
+            if self._log_file is None:
+                return
+            prefixes = self._prefixes.get(self.level)
+            self._log_file.write(
+                "".join(
+                    record
+                    for record in records
+                    if prefixes is None or record.partition(" ")[2].startswith(prefixes)
+                )
+            )
+            self._log_file.flush()
+
+    def close(self) -> None:
+        # Queued records are written before the file is closed
+        self._records.put(None)
+        self._thread.join()
+        self.open(None)
+
+
+class XlsxExporter(object):
+    """Runs exports on one writer thread fed by a bounded queue of jobs."""
 
-    return decorator
+    def __init__(
+        self,
+        on_done: Callable[[str, Union[int, Exception]], None],
+        max_pending: int = 4,
+    ) -> None:
+        self._on_done = on_done
+        self._queue: Queue[
+            Union[tuple[str, Iterable[tuple[datetime, str, int, int]]], None]
+        ] = Queue(maxsize=max_pending)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self, xlsx_path: str, rows: Iterable[tuple[datetime, str, int, int]]
+    ) -> bool:
+        # Never blocks the caller, returns False when too many are pending
+        try:
+            self._queue.put_nowait((xlsx_path, rows))
+        except Full:
+            return False
+        return True
+
+    def _run(self) -> None:
+        while (job := self._queue.get()) is not None:
+            xlsx_path, rows = job
+            try:
+                result: Union[int, Exception] = export_xlsx(xlsx_path, rows)
+            except Exception as export_error:
+                result = export_error
+            self._on_done(xlsx_path, result)
+
+    def close(self) -> None:
+        # Pending exports are finished before the writer stops
+        self._queue.put(None)
+        self._thread.join()
 
 
 class Program(object):
     _work_event = Event()
     _work_lock = Lock()
+    _stop_event = Event()
 
     def __init__(self) -> None:
         # Hold on screen countdown
         self._hold_screen()
         # Create main window
         self._create_window()
+        self._setup_gui_bridge()
         # Load configurations
         self._load_configs()
         # Setup logger util
+        self._log_sink = LogSink()
         self._setup_logger()
+        self._gui_bridge.add_ticker(self._drain_log)
         # Setup key listener
         self._setup_listener()
-        # Initialize worker
-        self._setup_worker()
 
     def _hold_screen(self) -> None:
         threaded_loop(None)(
@@ -224,7 +3029,10 @@ class Program(object):
 
     def _create_window(self) -> None:
         self._ctk_window = CTk()
-        self._ctk_tabview = CTkTabview(master=self._ctk_window, fg_color="transparent")
+        self._ctk_tabview = CTkTabview(
+            master=self._ctk_window, fg_color="transparent", command=self._open_tab
+        )
+        self._ctk_pages_created: set[str] = set()
         self._ctk_tabview.place_configure(relwidth=1.0, relheight=1.0)
         self._ctk_tabview_mainpage = self._ctk_tabview.add("主页")
         self._ctk_tabview_settings = self._ctk_tabview.add("设置")
@@ -232,7 +3040,16 @@ class Program(object):
         self._ctk_textbox_log = CTkTextbox(
             master=self._ctk_tabview_mainpage, state="disabled"
         )
-        self._ctk_textbox_log.place_configure(relwidth=0.775, relheight=0.85)
+        self._ctk_textbox_log.place_configure(relwidth=0.775, relheight=0.8)
+        self._ctk_label_metrics = CTkLabel(
+            master=self._ctk_tabview_mainpage, text="", anchor="w"
+        )
+        self._ctk_label_metrics.place_configure(
+            relwidth=0.775,
+            relheight=0.05,
+            relx=0.0,
+            rely=0.8,
+        )
         self._ctk_scrollableframe = CTkScrollableFrame(
             master=self._ctk_tabview_mainpage
         )
@@ -258,12 +3075,14 @@ class Program(object):
             relx=0.675,
             rely=0.85,
         )
-        for _ in range(13):
-            self._ctk_checkbox_all = CTkCheckBox(
+        self._ctk_checkboxes_category: dict[str, CTkCheckBox] = {}
+        for category_name in __CATEGORY_NAMES__:
+            self._ctk_checkboxes_category[category_name] = CTkCheckBox(
                 master=self._ctk_scrollableframe,
-                text="启用类别",
+                text=category_name,
+                command=self._toggle_category,
             )
-            self._ctk_checkbox_all.pack_configure(pady=5)
+            self._ctk_checkboxes_category[category_name].pack_configure(pady=5)
         self._ctk_button_once = CTkButton(
             master=self._ctk_tabview_mainpage,
             text="单次采集",
@@ -297,6 +3116,36 @@ class Program(object):
             relx=0.575,
             rely=0.9,
         )
+
+    def _setup_gui_bridge(self) -> None:
+        # Workers never touch widgets, their states go through the bridge
+        self._gui_bridge = GuiBridge(
+            self._ctk_window, lambda error: self._log_error(f"无法更新界面：{error}")
+        )
+        self._gui_bridge.register("progress", self._ctk_progressbar_worker.set)
+        self._gui_bridge.register("countdown", self._set_countdown)
+        self._gui_bridge.register("viewer", lambda value: self._show_viewer(*value))
+        self._gui_bridge.register(
+            "metrics", lambda text: self._ctk_label_metrics.configure(text=text)
+        )
+        self._gui_bridge.add_ticker(self._tick_countdown)
+        self._countdown: Union[tuple[float, float], None] = None
+        self._countdown_text = "00:00:00"
+        self._gui_bridge.start()
+
+    def _open_tab(self) -> None:
+        # Pages other than the main one are built the first time they are opened
+        match self._ctk_tabview.get():
+            case "设置" if "设置" not in self._ctk_pages_created:
+                self._create_settings_page()
+                self._initialize_settings_page()
+            case "关于" if "关于" not in self._ctk_pages_created:
+                self._create_about_page()
+            case _:
+                return
+        self._ctk_pages_created.add(self._ctk_tabview.get())
+
+    def _create_settings_page(self) -> None:
         # `ctk_frames_settings`: list of list of CTkFrame and times-used
         ctk_frames_settings_used_times: dict[CTkFrame, int] = {}
         for rely_thousandths in range(0, 8):
@@ -590,6 +3439,8 @@ class Program(object):
             relx=offsetx + 0.35,
             rely=0.1,
         )
+
+    def _create_about_page(self) -> None:
         self._ctk_label_announcement = CTkLabel(
             master=self._ctk_tabview_aboutpage,
             text=__ANNOUNCEMENT__,
@@ -600,6 +3451,9 @@ class Program(object):
             relx=0.0,
             rely=0.0,
         )
+        self._ctk_label_announcement.bind(
+            "<Button-1>", lambda *_, **__: webbrowser.open(__PROJECT_URL__)
+        )
 
     def _post_run(self) -> None:
         self._stop_worker()
@@ -609,6 +3463,13 @@ class Program(object):
 
     def run(self) -> None:
         self._ctk_window.update()
+        if "--first-frame" in sys.argv:
+            # Startup benchmark, stops as soon as the window is drawn
+            print("first frame", flush=True)
+            self._ctk_window.destroy()
+            return
+        # Worker and its heavy modules are set up once the window is shown
+        self._ctk_window.after_idle(self._setup_worker)
         self._ctk_window.mainloop()
         self._post_run()
 
@@ -621,11 +3482,28 @@ class Program(object):
         self._ctk_button_once.configure(
             state="disabled" if self._work_event.is_set() else "normal"
         )
-        self.work_loop(interval=self._config_parser.getint("核心", "采集周期"))
+        # Cleared while collecting automatically, like single runs expect
+        if self._work_event.is_set():
+            self._work_event.clear()
+            self.work_scheduled(interval=self._config_parser.getint("核心", "采集周期"))
+        else:
+            self._work_event.set()
 
     def _check_result(self) -> None:
         self.view_data()
 
+    def _toggle_category(self) -> None:
+        self._update_config(
+            "核心",
+            "启用类别",
+            ",".join(
+                category_name
+                for category_name, ctk_checkbox in self._ctk_checkboxes_category.items()
+                if ctk_checkbox.get()
+            ),
+        )
+        self._update_scan_jobs()
+
     def _change_transparency(self, value: float) -> None:
         transparency = float(value if value > 0.1 else 0.1)
         self._ctk_window.wm_attributes("-alpha", transparency)
@@ -670,8 +3548,10 @@ class Program(object):
             self._log_error(f"无法将存档路径设定为{os.path.abspath(archive_path)}")
 
     def _switch_logger(self) -> None:
-        logger_status = not self._config_parser.get("日志", "日志存盘")
+        logger_status = not self._config_parser.getboolean("日志", "日志存盘")
         log_level = self._config_parser.get("日志", "日志等级")
+        # Switch is stored first, the log file follows it
+        self._update_config("日志", "日志存盘", "yes" if logger_status else "no")
         self._setup_logger()
         match logger_status, log_level:
             case True, "warning":
@@ -694,7 +3574,6 @@ class Program(object):
                 self._ctk_combobox_loglevel.configure(state="readonly")
                 self._ctk_entry_log.configure(state="normal")
                 self._ctk_button_log.configure(state="normal")
-        self._update_config("日志", "日志存盘", "yes" if logger_status else "no")
         self._log_info(f"已{'启用' if logger_status else '禁用'}日志存盘")
 
     def _change_loglevel(self, value: str) -> None:
@@ -708,6 +3587,7 @@ class Program(object):
             "日志等级",
             log_level,
         )
+        self._log_sink.level = log_level
         match log_level:
             case "warning":
                 self._ctk_label_logger_status.configure(text="滤除信息")
@@ -745,7 +3625,7 @@ class Program(object):
 
     # ----------------------------------------------------------------
     # Config Manager
-    def _load_configs(self) -> None:
+    def _read_configs(self) -> None:
         # Load configurations
         temp_dir = tempfile.gettempdir()
         self._config_path = os.path.join(temp_dir, __CONFIG_FILE_NAME__)
@@ -763,17 +3643,46 @@ class Program(object):
                 default_config_parser["核心"] = {}
                 default_config_parser["核心"]["采集周期"] = "3600"
                 default_config_parser["核心"]["存档路径"] = "result"
+                default_config_parser["核心"]["帧源"] = "desktop"
+                default_config_parser["核心"]["回放路径"] = "replay"
+                default_config_parser["核心"]["回放帧率"] = "0"
+                default_config_parser["核心"]["全屏采集"] = "no"
+                default_config_parser["核心"]["采集进程"] = "no"
+                default_config_parser["核心"]["采集帧率"] = "30"
+                default_config_parser["核心"]["界面缩放"] = "1.0"
+                default_config_parser["核心"]["导出表格"] = "yes"
+                default_config_parser["核心"]["识别线程数"] = "2"
+                default_config_parser["核心"]["识别进程数"] = "0"
+                default_config_parser["核心"]["启用类别"] = ",".join(__CATEGORY_NAMES__)
+                default_config_parser["核心"]["增量采集"] = "yes"
+                default_config_parser["核心"]["最短过期时限"] = "600"
+                default_config_parser["核心"]["最长过期时限"] = "86400"
+                default_config_parser["核心"]["采集时长"] = "600"
+                default_config_parser["核心"]["采集模式"] = "sweep"
+                default_config_parser["核心"]["搜索页数"] = "1"
+                default_config_parser["核心"]["搜索前缀长度"] = "2"
+                default_config_parser["核心"]["名称容差"] = "0.25"
+                default_config_parser["核心"]["控制端口"] = "47913"
+                for resolution, regions in __DEFAULT_REGIONS__.items():
+                    default_config_parser["核心"][f"采集区域.{resolution}"] = regions
                 default_config_parser["日志"] = {}
                 default_config_parser["日志"]["日志存盘"] = "yes"
                 default_config_parser["日志"]["日志级别"] = "info"
                 default_config_parser["日志"]["日志路径"] = "logs"
+                default_config_parser["日志"]["显示行数"] = "1000"
+                default_config_parser["关注"] = {}
                 default_config_parser.write(default_config_file)
         else:
             default_config_parser.read(default_config_path, encoding="utf-8")
         if not os.path.exists(self._config_path):
             with open(self._config_path, mode="w", encoding="utf-8") as config_file:
                 default_config_parser.write(config_file)
+        # Options missing from older configurations fall back to defaults
+        self._config_parser.read_dict(default_config_parser)
         self._config_parser.read(self._config_path, encoding="utf-8")
+
+    def _load_configs(self) -> None:
+        self._read_configs()
         # Appearance mode
         set_appearance_mode(self._config_parser.get("界面", "主题风格"))
         # Initialize window
@@ -799,6 +3708,18 @@ class Program(object):
         )
         # Initialize widgets
         self._ctk_progressbar_worker.set(0)
+        enabled_categories = self._config_parser.get("核心", "启用类别").split(",")
+        for category_name, ctk_checkbox in self._ctk_checkboxes_category.items():
+            ctk_checkbox.select() if category_name in enabled_categories else ctk_checkbox.deselect()
+        hotkey_once = self._config_parser.get("热键", "单次采集")
+        if hotkey_once != "":
+            keyboard.register_hotkey(hotkey_once, self._ctk_button_once.invoke)
+        hotkey_auto = self._config_parser.get("热键", "定期采集")
+        if hotkey_auto != "":
+            keyboard.register_hotkey(hotkey_auto, self._ctk_swtich_auto.toggle)
+
+    def _initialize_settings_page(self) -> None:
+        transparency = self._config_parser.getfloat("界面", "透明度")
         self._ctk_slider_transparency.set(transparency)
         self._ctk_label_transparency_value.configure(
             text=f"{round(transparency * 100)}%"
@@ -852,19 +3773,12 @@ class Program(object):
                 self._ctk_entry_log.configure(state="normal")
                 self._ctk_button_log.configure(state="normal")
         hotkey_once = self._config_parser.get("热键", "单次采集")
-        if hotkey_once == "":
-            self._ctk_label_hkonce.configure(text="未绑定")
-        else:
-            self._ctk_label_hkonce.configure(text=hotkey_once)
-            keyboard.register_hotkey(hotkey_once, self._ctk_button_once.invoke)
+        self._ctk_label_hkonce.configure(
+            text="未绑定" if hotkey_once == "" else hotkey_once
+        )
         hotkey_auto = self._config_parser.get("热键", "定期采集")
-        if hotkey_auto == "":
-            self._ctk_label_hkauto.configure(text="未绑定")
-        else:
-            self._ctk_label_hkauto.configure(text=hotkey_auto)
-            keyboard.register_hotkey(hotkey_auto, self._ctk_swtich_auto.toggle)
-        self._ctk_label_announcement.bind(
-            "<Button-1>", lambda *_, **__: webbrowser.open(__PROJECT_URL__)
+        self._ctk_label_hkauto.configure(
+            text="未绑定" if hotkey_auto == "" else hotkey_auto
         )
 
     def _update_config(self, section: str, option: str, value: str) -> None:
@@ -877,28 +3791,21 @@ class Program(object):
     # ----------------------------------------------------------------
     # Logger
     def _setup_logger(self) -> None:
-        if self._config_parser.get("日志", "日志存盘"):
+        self._log_sink.level = self._config_parser.get("日志", "日志等级")
+        if self._config_parser.getboolean("日志", "日志存盘"):
             log_path = self._config_parser.get("日志", "日志路径")
             os.makedirs(log_path, exist_ok=True)
-            self._logger = open(
+            self._log_sink.open(
                 os.path.join(
                     log_path,
                     f"lafms-{__TIME_START_PROGRAM__}.log",
-                ),
-                mode="a+",
-                encoding="utf-8",
+                )
             )
         else:
-
-            class FakeLogger(object):
-                close: Callable[..., None] = lambda *args, **kwargs: None
-                flush: Callable[..., None] = lambda *args, **kwargs: None
-                write: Callable[..., None] = lambda *args, **kwargs: None
-
-            self._logger = FakeLogger()
+            self._log_sink.open(None)
 
     def _stop_logger(self) -> None:
-        self._logger.close()
+        self._log_sink.close()
 
     def _log_info(self, text: Any) -> None:
         self._textbox_log(f"[信息]: {text}")
@@ -910,25 +3817,21 @@ class Program(object):
         self._textbox_log(f"[错误]: {text}")
 
     def _textbox_log(self, text: str) -> None:
-        timestamp = datetime.now().time()
-        print(f"{timestamp} {text}\n", end="")
-        self._ctk_textbox_log.configure(state="normal")
-        self._ctk_textbox_log.insert(index="end", text=f"{timestamp} {text}\n")
-        self._ctk_textbox_log.see("end")
-        self._ctk_textbox_log.configure(state="disabled")
-        if self._config_parser.get("日志", "日志存盘"):
-            match self._config_parser.get("日志", "日志等级"):
-                case "warning":
-                    if not text.startswith("[信息]"):
-                        self._logger.write(f"{timestamp} {text}\n")
-                        self._logger.flush()
-                case "error":
-                    if text.startswith("[错误]"):
-                        self._logger.write(f"{timestamp} {text}\n")
-                        self._logger.flush()
-                case _:
-                    self._logger.write(f"{timestamp} {text}\n")
-                    self._logger.flush()
+        # Safe from any thread, the textbox is only touched by `_drain_log`
+        self._log_sink.put(text)
+
+    def _drain_log(self) -> None:
+        records = self._log_sink.drain(1000)
+        if records:
+            self._ctk_textbox_log.configure(state="normal")
+            self._ctk_textbox_log.insert(index="end", text="".join(records))
+            # Oldest lines are dropped once the textbox is full
+            lines_count = int(self._ctk_textbox_log.index("end-1c").split(".")[0]) - 1
+            extra_lines_count = lines_count - self._config_parser.getint("日志", "显示行数")
+            if extra_lines_count > 0:
+                self._ctk_textbox_log.delete("1.0", f"{extra_lines_count + 1}.0")
+            self._ctk_textbox_log.see("end")
+            self._ctk_textbox_log.configure(state="disabled")
 
     # ----------------------------------------------------------------
     # Listener
@@ -1041,60 +3944,1321 @@ class Program(object):
     # Worker
     def _setup_worker(self) -> None:
         self._work_event.set()
+        self._stop_event.clear()
+        # Scans are refused when the archive or the templates are unusable
+        self._worker_ready = True
         archive_path = self._config_parser.get("核心", "存档路径")
         try:
             os.makedirs(archive_path, exist_ok=True)
+            self._price_store = PriceStore(archive_path)
+            self._price_index = PriceIndex(self._price_store, archive_path)
+            self._price_aggregates = PriceAggregates(
+                os.path.join(archive_path, "aggregates.npz")
+            )
+            self._scan_history = ScanHistory(
+                os.path.join(archive_path, "scan-history.json"),
+                self._config_parser.getfloat("核心", "最短过期时限"),
+                self._config_parser.getfloat("核心", "最长过期时限"),
+            )
+            self._scan_checkpoint = ScanCheckpoint(
+                os.path.join(archive_path, "scan-checkpoint.json")
+            )
         except:
             self._log_error(f"无法创建存档文件夹{os.path.abspath(archive_path)}")
+            self._worker_ready = False
+        self._watchlist = Watchlist.from_config(self._config_parser["关注"])
+        # Searched items are watched, so always treated as volatile
+        self._scan_scheduler = ScanScheduler(
+            lambda job: 1.0
+            if job.item is not None
+            else self._scan_history.volatility(job.category)
+        )
+        # Search queries are sized by the known names they match
+        self._setup_items()
+        self._update_scan_jobs()
+        self._alerted: set[tuple[str, str, int]] = set()
+        if len(self._watchlist):
+            self._log_info(f"已载入{len(self._watchlist)}条关注规则")
+        self._frame_source = self._create_frame_source()
+        try:
+            self._frame_source.open()
+        except Exception as frame_source_error:
+            self._log_error(f"无法打开帧源：{frame_source_error}")
+            self._worker_ready = False
+        self._setup_templates()
+        self._setup_processes()
+        self._xlsx_exporter = XlsxExporter(self._on_exported)
+        self._regions: Union[dict[str, Region], None] = None
+        self._listings_counts: dict[str, int] = {}
+        # Each recognition process is waited on by one pipeline thread
+        self._scan_pipeline = ScanPipeline(
+            self._recognize_capture,
+            self._persist_capture,
+            self._on_capture_error,
+            workers=max(
+                self._config_parser.getint("核心", "识别线程数"),
+                self._config_parser.getint("核心", "识别进程数"),
+            ),
+        )
+        self._viewer_lock = Lock()
+        self._history_viewer: Union[HistoryViewer, None] = None
+        # Kept across scans, unchanged pages are never recognized twice
+        self._region_cache = RegionHashCache()
+        # Waits replace fixed padding, including the one of pyautogui
+        pyautogui.PAUSE = 0
+        self._scan_metrics = ScanMetrics()
+        self._render_waiter = RenderWaiter(
+            self._frame_source, self._template_registry, scan_metrics=self._scan_metrics
+        )
+        self._render_waiter.load(
+            os.path.join(tempfile.gettempdir(), __LATENCY_CACHE_NAME__)
+        )
+
+    def _setup_templates(self) -> None:
+        # Templates are decoded and scaled here, never inside the scan loop
+        self._template_registry = TemplateRegistry(
+            os.path.join(__DATA_PATH__, __IMAGES_DIR_NAME__),
+            os.path.join(tempfile.gettempdir(), __TEMPLATE_CACHE_NAME__),
+        )
+        try:
+            from_cache = self._template_registry.load(
+                self._frame_source.resolution,
+                self._config_parser.getfloat("核心", "界面缩放"),
+            )
+        except Exception as template_error:
+            self._log_error(f"无法载入模板：{template_error}")
+            self._worker_ready = False
+            return
+        self._log_info(
+            f"已{'从缓存载入' if from_cache else '生成'}" f"{len(self._template_registry)}个模板"
+        )
+        self._glyph_recognizer = GlyphRecognizer.from_registry(self._template_registry)
+
+    def _setup_items(self) -> None:
+        # Without a dictionary recognized names are stored as they are
+        self._item_dictionary = ItemDictionary(
+            self._config_parser.getfloat("核心", "名称容差")
+        )
+        self._unmatched_names: dict[tuple[str, str], int] = {}
+        items_path = os.path.join(__DATA_PATH__, __ITEMS_FILE_NAME__)
+        if not os.path.exists(items_path):
+            return
+        try:
+            from_cache = self._item_dictionary.load(
+                items_path,
+                # Kept with the user's own files rather than the shared tempdir
+                os.path.join(
+                    self._config_parser.get("核心", "存档路径"), __ITEMS_CACHE_NAME__
+                ),
+            )
+        except Exception as items_error:
+            self._log_error(f"无法载入物品词典：{items_error}")
+            return
+        self._log_info(
+            f"已{'从缓存载入' if from_cache else '生成'}" f"{len(self._item_dictionary)}个物品名称"
+        )
+
+    def _setup_processes(self) -> None:
+        self._process_executor: Union[ProcessPoolExecutor, None] = None
+        self._shared_frame_pool: Union[SharedFramePool, None] = None
+        processes_count = self._config_parser.getint("核心", "识别进程数")
+        if processes_count <= 0:
+            return
+        try:
+            # Slots hold a whole frame, enough for every page the pipeline queues
+            width, height = self._frame_source.resolution
+            self._shared_frame_pool = SharedFramePool(
+                processes_count + 6, width * height * 4
+            )
+            # Processes map the template cache written by the main process
+            self._process_executor = ProcessPoolExecutor(
+                processes_count,
+                initializer=_initialize_recognition_worker,
+                initargs=(
+                    os.path.join(__DATA_PATH__, __IMAGES_DIR_NAME__),
+                    os.path.join(tempfile.gettempdir(), __TEMPLATE_CACHE_NAME__),
+                    self._frame_source.resolution,
+                    self._config_parser.getfloat("核心", "界面缩放"),
+                ),
+            )
+        except Exception as process_error:
+            self._log_error(f"无法启动识别进程：{process_error}")
+            return
+        self._log_info(f"已启动{processes_count}个识别进程")
+
+    def _update_scan_jobs(self) -> None:
+        self._scan_scheduler.clear()
+        self._search_queries: dict[str, str] = {}
+        if self._config_parser.get("核心", "采集模式") == "targeted":
+            # Watched items are searched, batched by their shared prefixes
+            for query, names in batch_by_prefix(
+                (rule.name for rule in self._watchlist),
+                self._config_parser.getint("核心", "搜索前缀长度"),
+                # Every known name a query matches has to fit in the pages read
+                self._config_parser.getint("核心", "搜索页数") * __ROWS_PER_PAGE__,
+                self._item_dictionary.names,
+            ):
+                self._scan_scheduler.add(ScanJob(__SEARCH_CATEGORY_NAME__, query))
+                self._search_queries.update(dict.fromkeys(names, query))
+            return
+        enabled_categories = self._config_parser.get("核心", "启用类别").split(",")
+        for category_name in __CATEGORY_NAMES__:
+            if category_name in enabled_categories:
+                self._scan_scheduler.add(ScanJob(category_name))
+
+    def _on_exported(self, xlsx_path: str, result: Union[int, Exception]) -> None:
+        if isinstance(result, Exception):
+            self._log_error(f"无法导出表格{os.path.abspath(xlsx_path)}：{result}")
+        else:
+            self._log_info(f"已导出{result}条价格至表格{os.path.abspath(xlsx_path)}")
+
+    def _create_frame_source(self) -> FrameSource:
+        frame_source: FrameSource
+        match self._config_parser.get("核心", "帧源"):
+            case "replay":
+                frame_source = ReplayFrameSource(
+                    self._config_parser.get("核心", "回放路径"),
+                    self._config_parser.getfloat("核心", "回放帧率"),
+                    loop=True,
+                )
+            case _:
+                frame_source = DesktopFrameSource()
+        if self._config_parser.getboolean("核心", "采集进程"):
+            # Capturing leaves the interpreter of the GUI and the hooks
+            return CaptureServiceFrameSource(
+                frame_source,
+                frame_rate=self._config_parser.getfloat("核心", "采集帧率"),
+            )
+        return frame_source
 
     def _stop_worker(self) -> None:
+        self._stop_event.set()
         self._work_event.clear()
-        if self._work_lock.locked():
-            self._work_lock.release()
+        # A running scan stops at its next page, nothing is torn down under it.
+        # The lock is kept, so no scan starts after this point
+        if not self._work_lock.acquire(timeout=30.0):
+            self._log_warning("采集未能及时停止，强制关闭")
+        self._frame_source.close()
+        self._scan_pipeline.close()
+        if self._process_executor is not None:
+            self._process_executor.shutdown(cancel_futures=True)
+        if self._shared_frame_pool is not None:
+            self._shared_frame_pool.close()
+        self._xlsx_exporter.close()
+        try:
+            self._render_waiter.save(
+                os.path.join(tempfile.gettempdir(), __LATENCY_CACHE_NAME__)
+            )
+        except OSError:
+            pass
 
     @threaded(_work_event)
     def work_once(self) -> None:
-        if self._work_lock.acquire(blocking=False):
-            self._collect()
-            self._work_lock.release()
+        if not self._worker_ready:
+            self._log_error("采集初始化失败，无法采集")
+        elif self._work_lock.acquire(blocking=False):
+            # Single runs go through every job in order
+            try:
+                self._collect(list(self._scan_scheduler))
+            except Exception as collect_error:
+                self._log_error(f"采集失败：{collect_error}")
+            finally:
+                self._work_lock.release()
+        else:
+            self._log_warning("上一次采集尚未结束，已跳过本次采集")
 
-    @threaded_loop(_work_event)
-    def work_loop(self, interval: int) -> None:
-        if self._work_lock.acquire(blocking=False):
-            self._collect()
-            self._work_lock.release()
-        self._update_countdown(interval)
+    @threaded()
+    def work_scheduled(self, interval: int) -> None:
+        # One window per interval, stopped by switching automatic collection off
+        if not self._worker_ready:
+            self._log_error("采集初始化失败，无法采集")
+            return
+        while not self._work_event.is_set() and not self._stop_event.is_set():
+            window_end = time.monotonic() + interval
+            budget = min(interval, self._config_parser.getint("核心", "采集时长"))
+            jobs = self._scan_scheduler.plan(time.time(), budget)
+            if self._work_lock.acquire(blocking=False):
+                # A failed cycle is logged, the next window runs as planned
+                try:
+                    self._collect(jobs, time.time() + budget)
+                except Exception as collect_error:
+                    self._log_error(f"采集失败：{collect_error}")
+                finally:
+                    self._work_lock.release()
+            else:
+                self._log_warning("上一次采集尚未结束，已跳过本次采集")
+            # Countdown is ticked by the GUI, this thread only sleeps
+            self._gui_bridge.post("countdown", (window_end, interval))
+            self._work_event.wait(max(window_end - time.monotonic(), 0.0))
+        self._gui_bridge.post("countdown", None)
 
     @threaded()
     def view_data(self) -> None:
-        """TODO: Implement this method for data viewing."""
-        todo = "待实现"
-        self._log_warning(todo)
+        if not self._viewer_lock.acquire(blocking=False):
+            return
+        try:
+            # Only rows appended since the last time are aggregated
+            self._price_index.update()
+            rows_count = self._price_aggregates.update(self._price_store)
+            self._price_aggregates.save()
+            self._log_info(f"已汇总{rows_count}条新价格")
+            summary = self._price_aggregates.table(self._price_store)
+            history = HistoryTable(self._price_store)
+        except Exception as viewer_error:
+            self._log_error(f"无法读取存档：{viewer_error}")
+            return
+        finally:
+            self._viewer_lock.release()
+        self._gui_bridge.post("viewer", (summary, history))
 
-    @threaded()
-    def _update_countdown(self, interval: int) -> None:
-        next_time = time.time() + interval
-        while next_time > time.time() and not self._work_event.wait(0.1):
-            count_down = next_time - time.time()
-            self._ctk_progressbar_worker.set(1 - count_down / interval)
-            self._ctk_label_countdown.configure(text=timedelta(seconds=int(count_down)))
-        self._ctk_progressbar_worker.set(0)
-        self._ctk_label_countdown.configure(text="00:00:00")
+    def _show_viewer(
+        self, summary: list[tuple[Any, ...]], history: HistoryTable
+    ) -> None:
+        if self._history_viewer is not None and self._history_viewer.exists():
+            self._history_viewer.destroy()
+        self._history_viewer = HistoryViewer(
+            self._ctk_window, summary, history, self._item_history
+        )
+
+    def _item_history(self, name: str) -> list[tuple[Any, ...]]:
+        item_id = self._price_store.item_id(name)
+        if item_id is None:
+            return []
+        columns = self._price_index.query(item_id, 0.0, time.time() + 1.0)
+        return [
+            (
+                datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M"),
+                name,
+                price,
+                quantity,
+            )
+            for timestamp, price, quantity in zip(
+                columns["timestamp"][::-1].tolist(),
+                columns["price"][::-1].tolist(),
+                columns["quantity"][::-1].tolist(),
+            )
+        ]
 
-    def _collect(self) -> None:
-        """TODO: Implement this method for data collecting."""
-        __NOTIFICATION_TOASTER__.show_toast(
-            "Lost Ark Flea Market Scanner",
-            "开始采集数据",
-            os.path.join(__DATA_PATH__, __ICON_FILE_NAME__),
-            threaded=True,
+    def _set_countdown(self, countdown: Union[tuple[float, float], None]) -> None:
+        self._countdown = countdown
+        self._tick_countdown()
+
+    def _tick_countdown(self) -> None:
+        # Remaining time comes from a monotonic deadline, labels change once a second
+        count_down, interval = 0.0, 1.0
+        if self._countdown is not None:
+            deadline, interval = self._countdown
+            count_down = max(deadline - time.monotonic(), 0.0)
+            if count_down == 0.0:
+                self._countdown = None
+        countdown_text = (
+            "00:00:00"
+            if self._countdown is None
+            else str(timedelta(seconds=int(count_down)))
+        )
+        if countdown_text == self._countdown_text:
+            return
+        self._countdown_text = countdown_text
+        self._ctk_label_countdown.configure(text=countdown_text)
+        self._ctk_progressbar_worker.set(
+            0 if self._countdown is None else 1 - count_down / interval
         )
+
+    def _collect(self, jobs: list[ScanJob], deadline: float = float("inf")) -> None:
+        show_toast("开始采集数据")
         self._log_info("开始采集数据")
-        self._log_warning("待实现")
+        self._regions = regions = self._load_regions()
+        if regions is None:
+            return
+        self._region_cache.reset_stats()
+        self._scan_metrics.reset()
+        self._alerted.clear()
+        start_time = time.time()
+        self._listings_counts = dict.fromkeys(
+            (*__CATEGORY_NAMES__, __SEARCH_CATEGORY_NAME__), 0
+        )
+        skipped_categories: list[str] = []
+        attempted_count = postponed_count = 0
+        # A job interrupted by the last cycle or by closing is resumed first
+        resumed_job = self._scan_checkpoint.job
+        if resumed_job is not None:
+            if resumed_job in self._scan_scheduler:
+                jobs = [resumed_job, *(job for job in jobs if job != resumed_job)]
+            else:
+                self._scan_checkpoint.clear()
+                resumed_job = None
+        for job_index, job in enumerate(jobs):
+            if self._stop_event.is_set():
+                break
+            if time.time() >= deadline:
+                postponed_count = len(jobs) - job_index
+                break
+            attempted_count += 1
+            job_time = time.time()
+            start_page, cursor, rows = 0, None, None
+            if job == resumed_job:
+                start_page, cursor, rows = (
+                    self._scan_checkpoint.page,
+                    self._scan_checkpoint.cursor,
+                    self._scan_checkpoint.rows,
+                )
+                self._log_info(f"从{job.item or job.category}第{start_page + 1}页继续采集")
+            self._scan_checkpoint.begin(job, start_page, cursor, rows)
+            if job.item is not None:
+                collected = self._collect_search(
+                    regions, job, start_page, cursor, deadline
+                )
+            else:
+                collected = self._collect_category(
+                    regions, job, start_page, cursor, deadline
+                )
+            if collected is None:
+                # Checkpoint keeps the position for the next cycle
+                if not self._stop_event.is_set():
+                    postponed_count = len(jobs) - job_index
+                break
+            if not collected:
+                skipped_categories.append(job.category)
+            self._scan_scheduler.record(job, job_time, time.time() - job_time)
+            self._gui_bridge.post("progress", (job_index + 1) / len(jobs))
+        self._gui_bridge.post("progress", 0)
+        self._scan_pipeline.join()
+        try:
+            self._scan_history.save()
+        except OSError as history_error:
+            self._log_error(f"无法保存采集记录：{history_error}")
+        self._save_unmatched_names()
+        for category_name in dict.fromkeys(
+            job.category for job in jobs[:attempted_count]
+        ):
+            self._log_info(
+                f"类别{category_name}识别到{self._listings_counts[category_name]}条价格"
+            )
+        if skipped_categories:
+            self._log_info(f"类别{'、'.join(skipped_categories)}首页未变化，已跳过翻页")
+        if postponed_count:
+            self._log_info(f"已超出采集时长，{postponed_count}个任务推迟至下一周期")
+        listings_count = sum(self._listings_counts.values())
+        self._log_info(f"共识别到{listings_count}条价格")
+        self._log_info(f"已索引{self._price_index.update()}条新价格")
+        if listings_count and self._config_parser.getboolean("核心", "导出表格"):
+            # Milliseconds keep cycles started within one second apart
+            start_text = datetime.fromtimestamp(start_time).strftime("%Y%m%d%H%M%S%f")
+            xlsx_path = os.path.join(
+                self._config_parser.get("核心", "存档路径"),
+                f"lafms-{start_text[:-3]}.xlsx",
+            )
+            if not self._xlsx_exporter.submit(
+                xlsx_path, iter_price_rows(self._price_store, start_time, time.time())
+            ):
+                self._log_warning(f"导出任务过多，已跳过表格{os.path.abspath(xlsx_path)}")
+        self._log_info(
+            f"区域缓存命中{self._region_cache.hits}次，未命中{self._region_cache.misses}次"
+        )
+        cache_info = self._glyph_recognizer.cache_info
+        self._log_info(f"字形缓存命中{cache_info.hits}次，未命中{cache_info.misses}次")
+        self._write_metrics(jobs)
+
+    def _write_metrics(self, jobs: list[ScanJob]) -> None:
+        # One JSON line per cycle, next to the log files
+        cache_info = self._glyph_recognizer.cache_info
+        metrics = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "jobs": [job.item or job.category for job in jobs],
+            **self._scan_metrics.to_dict(),
+            "region_cache": {
+                "hits": self._region_cache.hits,
+                "misses": self._region_cache.misses,
+            },
+            "glyph_cache": {"hits": cache_info.hits, "misses": cache_info.misses},
+        }
+        self._log_info(f"采集{metrics['pages']}页，每秒{metrics['pages_per_second']:.2f}页")
+        if not self._config_parser.getboolean("日志", "日志存盘"):
+            return
+        log_path = self._config_parser.get("日志", "日志路径")
+        try:
+            os.makedirs(log_path, exist_ok=True)
+            with open(
+                os.path.join(log_path, f"lafms-{__TIME_START_PROGRAM__}.metrics.jsonl"),
+                mode="a",
+                encoding="utf-8",
+            ) as metrics_file:
+                metrics_file.write(f"{json.dumps(metrics, ensure_ascii=False)}\n")
+        except OSError as metrics_error:
+            self._log_error(f"无法保存采集指标：{metrics_error}")
+
+    def _post_metrics(self) -> None:
+        # Compact live summary for the main page
+        lookups_count = self._region_cache.hits + self._region_cache.misses
+        self._gui_bridge.post(
+            "metrics",
+            f"{self._scan_metrics.pages_per_second:.1f}页/秒  "
+            f"识别{self._scan_metrics.quantile('recognize', 0.5) * 1000:.0f}ms  "
+            f"等待{self._scan_metrics.quantile('wait', 0.5) * 1000:.0f}ms  "
+            f"缓存命中{self._region_cache.hits / max(lookups_count, 1):.0%}  "
+            f"队列{self._scan_pipeline.pending_count}",
+        )
+
+    def _collect_category(
+        self,
+        regions: Mapping[str, Region],
+        job: ScanJob,
+        start_page: int,
+        cursor: Union[str, None],
+        deadline: float,
+    ) -> Union[bool, None]:
+        self._render_waiter.perform(
+            "切换类别",
+            lambda: self._click_category(
+                regions, __CATEGORY_NAMES__.index(job.category)
+            ),
+            "物品列表",
+            regions["物品列表"],
+        )
+        return self._collect_pages(
+            regions,
+            job,
+            __MAX_PAGES__,
+            self._config_parser.getboolean("核心", "增量采集"),
+            start_page,
+            cursor,
+            deadline,
+        )
+
+    def _collect_search(
+        self,
+        regions: Mapping[str, Region],
+        job: ScanJob,
+        start_page: int,
+        cursor: Union[str, None],
+        deadline: float,
+    ) -> Union[bool, None]:
+        assert job.item is not None
+        query = job.item
+        if "搜索框" not in regions:
+            self._log_error("缺少采集区域搜索框")
+            self._scan_checkpoint.clear()
+            return True
+        self._render_waiter.perform(
+            "搜索",
+            lambda: self._type_search(regions, query),
+            "物品列表",
+            regions["物品列表"],
+        )
+        # Only the top result pages are read
+        return self._collect_pages(
+            regions,
+            job,
+            self._config_parser.getint("核心", "搜索页数"),
+            False,
+            start_page,
+            cursor,
+            deadline,
+        )
+
+    def _collect_pages(
+        self,
+        regions: Mapping[str, Region],
+        job: ScanJob,
+        max_pages: int,
+        incremental: bool,
+        start_page: int = 0,
+        cursor: Union[str, None] = None,
+        deadline: float = float("inf"),
+    ) -> Union[bool, None]:
+        # Returns whether the pages were gone through, None when interrupted
+        category_name = job.category
+        first_page = end_page = 0
+        stored_rows = None
+        if start_page > 0:
+            stored_rows = self._scan_checkpoint.rows
+            resumed_page = self._skip_pages(regions, start_page, cursor, stored_rows)
+            if resumed_page is None:
+                self._scan_checkpoint.finish(job, start_page)
+                return True
+            first_page = end_page = resumed_page
+        for page_index in range(first_page, max_pages):
+            if page_index > first_page and (
+                self._stop_event.is_set() or time.time() >= deadline
+            ):
+                return None
+            timestamp = time.time()
+            with self._scan_metrics.measure("capture"):
+                page_frames, shared_frames = self._capture_frames(regions, True)
+            # Pool slots are reused once the page is recognized
+            page_image = page_frames["页码"].copy()
+            # Top page is sampled first, unchanged categories stop there
+            deep_scan = not incremental or page_index > 0
+            if not deep_scan:
+                deep_scan = self._scan_history.sample(
+                    category_name,
+                    ScanHistory.snapshot(self._recognize(regions, page_frames)),
+                    timestamp,
+                )
+            self._scan_pipeline.submit(
+                PageCapture(
+                    category_name,
+                    page_index,
+                    timestamp,
+                    page_frames,
+                    shared_frames,
+                    job,
+                    stored_rows if page_index < start_page else None,
+                )
+            )
+            end_page = page_index + 1
+            self._scan_metrics.sample_queue(
+                "pipeline", self._scan_pipeline.pending_count
+            )
+            self._scan_metrics.sample_queue("log", self._log_sink.pending_count)
+            if not deep_scan:
+                self._scan_checkpoint.finish(job, end_page)
+                return False
+            page = self._read_page(page_image)
+            if page is not None and page[0] >= page[1]:
+                break
+            # An unreadable indicator ends once the page stops changing
+            if not self._turn_page(regions, page_image):
+                break
+        self._scan_checkpoint.finish(job, end_page)
+        if incremental and not self._stop_event.is_set():
+            self._scan_history.mark_scanned(category_name, time.time())
+        return True
+
+    def _skip_pages(
+        self,
+        regions: Mapping[str, Region],
+        start_page: int,
+        cursor: Union[str, None],
+        stored_rows: Union[tuple[str, int, int], None],
+    ) -> Union[int, None]:
+        # Stored pages are turned over, the last one is compared with the cursor
+        # and read again when it changed or was not completely stored.
+        # Returns the page to continue from, None when there are no more pages
+        frames, _ = self._capture_frames(regions)
+        for _ in range(start_page - 1):
+            if not self._turn_page(regions, frames["页码"]):
+                return None
+            frames, _ = self._capture_frames(regions)
+        if ScanHistory.snapshot(self._recognize(regions, frames)) != cursor:
+            self._log_info(f"第{start_page}页已变化，从该页重新采集")
+            return start_page - 1
+        if stored_rows is not None:
+            segment, _, end = stored_rows
+            if self._price_store.count_rows(segment) < end:
+                self._log_info(f"第{start_page}页未完整存储，从该页重新采集")
+                return start_page - 1
+        if not self._turn_page(regions, frames["页码"]):
+            return None
+        return start_page
+
+    def _turn_page(self, regions: Mapping[str, Region], page_image: np.ndarray) -> bool:
+        # Pages of one item share their names, prices and the indicator differ
+        return self._render_waiter.perform(
+            "翻页",
+            lambda: self._click_next_page(regions, page_image),
+            "翻页区域",
+            bound_regions(
+                regions[name]
+                for name in ("列表", "物品列表", "数量列", "价格列", "页码")
+                if name in regions
+            ),
+        )
+
+    def _recognize_capture(self, capture: PageCapture) -> list[Listing]:
+        assert self._regions is not None
+        try:
+            with self._scan_metrics.measure("recognize"):
+                return self._recognize(
+                    self._regions, capture.frames, capture.shared_frames
+                )
+        finally:
+            if self._shared_frame_pool is not None and capture.shared_frames:
+                self._shared_frame_pool.release(capture.shared_frames)
+
+    def _persist_capture(self, capture: PageCapture, listings: list[Listing]) -> None:
+        cursor = ScanHistory.snapshot(listings)
+        listings = self._resolve_names(capture.category, listings)
+        if capture.stored_rows is not None:
+            listings = self._skip_stored(listings, capture.stored_rows)
+        with self._scan_metrics.measure("persist"):
+            # Position is saved along with the rows the page is about to take
+            if capture.job is not None:
+                segment = PriceStore.segment(capture.timestamp)
+                start = self._price_store.count_rows(segment)
+                self._scan_checkpoint.advance(
+                    capture.job,
+                    capture.page,
+                    cursor,
+                    (segment, start, start + len(listings)),
+                )
+            self._price_store.append(listings, capture.timestamp)
+        self._listings_counts[capture.category] += len(listings)
+        self._scan_metrics.count_page()
+        self._post_metrics()
+        # Rows are checked as soon as they are stored, not after the scan
+        for listing in listings:
+            alert = self._watchlist.check(listing)
+            if alert is not None:
+                self._alert(capture.category, listing, *alert)
+
+    def _skip_stored(
+        self, listings: list[Listing], stored_rows: tuple[str, int, int]
+    ) -> list[Listing]:
+        # Listings of a page read again are stored only if not stored before
+        segment, start, end = stored_rows
+        columns = self._price_store.read(segment)
+        stored_counts = Counter(
+            zip(
+                columns["item"][start:end].tolist(),
+                columns["price"][start:end].tolist(),
+                columns["quantity"][start:end].tolist(),
+            )
+        )
+        new_listings: list[Listing] = []
+        for listing in listings:
+            key = (
+                self._price_store.item_id(listing.name),
+                listing.price,
+                listing.quantity,
+            )
+            if stored_counts[key] > 0:
+                stored_counts[key] -= 1
+            else:
+                new_listings.append(listing)
+        return new_listings
+
+    def _resolve_names(
+        self, category_name: str, listings: list[Listing]
+    ) -> list[Listing]:
+        # Names are snapped to the dictionary, unmatched ones wait for review
+        if not len(self._item_dictionary):
+            return listings
+        resolved_listings: list[Listing] = []
+        for listing in listings:
+            match = self._item_dictionary.resolve(listing.name)
+            if match is None:
+                key = (category_name, listing.name)
+                self._unmatched_names[key] = self._unmatched_names.get(key, 0) + 1
+                continue
+            resolved_listings.append(listing._replace(name=match.name))
+        return resolved_listings
+
+    def _save_unmatched_names(self) -> None:
+        if not self._unmatched_names:
+            return
+        self._log_warning(f"{len(self._unmatched_names)}个物品名称无法匹配，已加入待审核列表")
+        review_path = os.path.join(
+            self._config_parser.get("核心", "存档路径"), "unmatched-names.jsonl"
+        )
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        try:
+            with open(review_path, mode="a", encoding="utf-8") as review_file:
+                for (category_name, name), count in self._unmatched_names.items():
+                    review_file.write(
+                        json.dumps(
+                            {
+                                "time": timestamp,
+                                "category": category_name,
+                                "name": name,
+                                "count": count,
+                            },
+                            ensure_ascii=False,
+                        )
+                        + "\n"
+                    )
+        except OSError as review_error:
+            self._log_error(f"无法保存待审核名称：{review_error}")
+        self._unmatched_names.clear()
+
+    def _alert(
+        self, category_name: str, listing: Listing, rule: WatchRule, action: str
+    ) -> None:
+        # Same price is announced once per scan
+        if (rule.name, action, listing.price) in self._alerted:
+            return
+        self._alerted.add((rule.name, action, listing.price))
+        threshold = rule.buy_price if action == "买入" else rule.sell_price
+        message = f"{listing.name}当前价格{listing.price}，已达到{action}价{threshold}"
+        self._log_info(message)
+        show_toast(message)
+        # Jobs holding watched items are scheduled sooner for a while
+        if category_name == __SEARCH_CATEGORY_NAME__:
+            query = self._search_queries.get(rule.name)
+            if query is None:
+                return
+            job = ScanJob(category_name, query)
+        else:
+            job = ScanJob(category_name)
+        self._scan_scheduler.boost(job, 1.0, time.time())
+
+    def _on_capture_error(self, capture: PageCapture, error: Exception) -> None:
+        self._log_error(f"类别{capture.category}第{capture.page + 1}页处理失败：{error}")
+
+    def _read_page(self, page_image: np.ndarray) -> Union[tuple[int, int], None]:
+        # Page indicator reads like `3/10`
+        for text in self._glyph_recognizer.recognize_column(page_image):
+            current_page, _, total_pages = text.partition("/")
+            if current_page.isdigit() and total_pages.isdigit():
+                return int(current_page), int(total_pages)
+        return None
+
+    def _click_category(self, regions: Mapping[str, Region], index: int) -> None:
+        if not self._frame_source.interactive:
+            return
+        x, y, width, height = regions["类别树"]
+        pyautogui.click(
+            x + width // 2,
+            y + round(height * (index + 0.5) / len(__CATEGORY_NAMES__)),
+        )
+
+    def _type_search(self, regions: Mapping[str, Region], query: str) -> None:
+        if not self._frame_source.interactive:
+            return
+        x, y, width, height = regions["搜索框"]
+        pyautogui.click(x + width // 2, y + height // 2)
+        # Typed through keyboard, which handles non-ASCII names
+        keyboard.send("ctrl+a")
+        keyboard.write(query)
+        keyboard.send("enter")
+
+    def _click_next_page(
+        self, regions: Mapping[str, Region], page_image: np.ndarray
+    ) -> None:
+        if not self._frame_source.interactive:
+            return
+        x, y, width, height = regions["页码"]
+        if "next_page" in self._template_registry and (
+            location := self._template_registry.match("next_page", page_image)
+        ):
+            template_height, template_width = self._template_registry["next_page"].shape
+            pyautogui.click(
+                x + location[0] + template_width // 2,
+                y + location[1] + template_height // 2,
+            )
+        else:
+            pyautogui.click(x + width - height // 2, y + height // 2)
+
+    def _load_regions(self) -> Union[dict[str, Region], None]:
+        width, height = self._frame_source.resolution
+        option = f"采集区域.{width}x{height}"
+        if not self._config_parser.has_option("核心", option):
+            self._log_error(f"未配置分辨率{width}x{height}的采集区域")
+            return None
+        try:
+            regions = parse_regions(self._config_parser.get("核心", option))
+        except ValueError:
+            self._log_error(f"分辨率{width}x{height}的采集区域格式有误")
+            return None
+        missing_names = [name for name in __REGION_NAMES__ if name not in regions]
+        if missing_names:
+            self._log_error(f"缺少采集区域{'、'.join(missing_names)}")
+            return None
+        # Listings are segmented from the panel holding every column
+        if "列表" not in regions:
+            regions["列表"] = bound_regions(
+                regions[name] for name in ("物品列表", "数量列", "价格列") if name in regions
+            )
+        return regions
+
+    def _recognize(
+        self,
+        regions: Mapping[str, Region],
+        frames: Mapping[str, np.ndarray],
+        shared_frames: Union[SharedFrames, None] = None,
+    ) -> list[Listing]:
+        fingerprint = self._region_cache.fingerprint(
+            *(frames[name] for name in ("列表", "物品列表", "价格列", "数量列") if name in frames)
+        )
+        cached_listings = self._region_cache.get(fingerprint)
+        if cached_listings is not None:
+            return list(cached_listings)
+        if self._process_executor is not None and shared_frames is not None:
+            listings, unreadable_rows = self._process_executor.submit(
+                _recognize_shared_frames, shared_frames, dict(regions)
+            ).result()
+        else:
+            listings, unreadable_rows = recognize_listings(
+                self._glyph_recognizer, regions, frames
+            )
+        for unreadable_row in unreadable_rows:
+            self._log_warning(f"无法识别价格行：{unreadable_row}")
+        self._region_cache.put(fingerprint, tuple(listings))
+        return listings
+
+    def _grab_regions(self, regions: Mapping[str, Region]) -> dict[str, np.ndarray]:
+        if self._config_parser.getboolean("核心", "全屏采集"):
+            # Debug fallback, whole frame is captured and then cropped
+            return crop_regions(self._frame_source.grab(), regions)
+        return self._frame_source.grab_regions(regions)
+
+    def _capture_frames(
+        self, regions: Mapping[str, Region], shared: bool = False
+    ) -> tuple[dict[str, np.ndarray], Union[SharedFrames, None]]:
+        # Capture buffers are reused, so frames are copied out of them, into the
+        # shared pool if asked to. A frame the capture service overwrote while
+        # being copied is grabbed again. Only regions pages are read from count
+        regions = read_regions(regions)
+        while True:
+            frames = self._grab_regions(regions)
+            sequence = self._frame_source.sequence
+            if shared and self._shared_frame_pool is not None:
+                shared_frames, frames = self._shared_frame_pool.store(frames)
+            else:
+                shared_frames = None
+                frames = {name: frame.copy() for name, frame in frames.items()}
+            if self._frame_source.valid(sequence):
+                return frames, shared_frames
+            if self._shared_frame_pool is not None and shared_frames:
+                self._shared_frame_pool.release(shared_frames)
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One command per line, answered by one JSON line."""
+
+    server: "ControlServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            command = ""
+            try:
+                # Blank lines and undecodable bytes are answered like bad commands
+                words = line.decode("utf-8").split()
+                if not words:
+                    raise ValueError("空命令")
+                command, *arguments = words
+                reply = self.server.program.control(command, arguments)
+            except Exception as control_error:
+                reply = {"ok": False, "error": str(control_error)}
+            self.wfile.write(
+                f"{json.dumps(reply, ensure_ascii=False)}\n".encode("utf-8")
+            )
+            if command == "quit":
+                return
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], program: "HeadlessProgram") -> None:
+        self.program = program
+        super().__init__(address, ControlHandler)
+
+
+class HeadlessProgram(Program):
+    """Collects on schedule without any window, for unattended machines.
+
+    Configurations, logger and worker are those of the windowed program.
+    It is controlled through a socket bound to the local host only.
+    """
+
+    def __init__(self) -> None:
+        # Screen has to stay on for desktop captures only
+        if os.name == "nt":
+            self._hold_screen()
+        self._read_configs()
+        # Posted states are never applied, the status command reads them
+        self._gui_bridge = GuiBridge(
+            None, lambda error: self._log_error(f"无法更新界面：{error}")
+        )
+        self._log_sink = LogSink(displayed=False)
+        self._setup_logger()
+
+    def run(self) -> None:
+        port = self._config_parser.getint("核心", "控制端口")
+        self._control_server = ControlServer(("127.0.0.1", port), self)
+        self._setup_worker()
+        self._log_info(f"已启动后台采集，控制端口{port}")
+        self.control("start", [])
+        try:
+            self._control_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self._control_server.server_close()
+        self._post_run()
+
+    def _post_run(self) -> None:
+        self._stop_worker()
+        self._stop_logger()
+
+    @threaded()
+    def _work_locked(self) -> None:
+        # Single run of `work_once`, the caller already holds the lock
+        try:
+            self._collect(list(self._scan_scheduler))
+        except Exception as collect_error:
+            self._log_error(f"采集失败：{collect_error}")
+        finally:
+            self._work_lock.release()
+
+    def control(self, command: str, arguments: list[str]) -> dict[str, Any]:
+        match command:
+            case "status":
+                checkpoint = self._scan_checkpoint.job if self._worker_ready else None
+                return {
+                    "ok": True,
+                    "ready": self._worker_ready,
+                    "collecting": self._work_lock.locked(),
+                    "scheduled": not self._work_event.is_set(),
+                    "jobs": [job.item or job.category for job in self._scan_scheduler],
+                    "checkpoint": None
+                    if checkpoint is None
+                    else {
+                        "job": checkpoint.item or checkpoint.category,
+                        "page": self._scan_checkpoint.page,
+                    },
+                    "metrics": self._scan_metrics.to_dict(),
+                }
+            case "once" | "start" if not self._worker_ready:
+                return {"ok": False, "error": "采集初始化失败"}
+            case "once":
+                if not self._work_event.is_set():
+                    return {"ok": False, "error": "定期采集中"}
+                # Taken here, so that a scan in progress is told to the client
+                if not self._work_lock.acquire(blocking=False):
+                    return {"ok": False, "error": "上一次采集尚未结束，已跳过本次采集"}
+                self._work_locked()
+            case "start":
+                if not self._work_event.is_set():
+                    return {"ok": False, "error": "定期采集中"}
+                # Cleared while collecting automatically, like the switch does
+                self._work_event.clear()
+                self.work_scheduled(
+                    interval=int(arguments[0])
+                    if arguments
+                    else self._config_parser.getint("核心", "采集周期")
+                )
+            case "stop":
+                # Current window finishes, its checkpoint is kept
+                self._work_event.set()
+            case "quit":
+                self._work_event.set()
+                Thread(target=self._control_server.shutdown, daemon=True).start()
+            case _:
+                return {"ok": False, "error": f"未知命令{command}"}
+        self._log_info(f"已执行命令{command}")
+        return {"ok": True}
+
+
+# ----------------------------------------------------------------
+# Benchmarks
+def _load_benchmark_setup(
+    frame_source: FrameSource,
+) -> tuple[dict[str, Region], TemplateRegistry]:
+    config_parser = ConfigParser()
+    config_parser.read(
+        os.path.join(__DATA_PATH__, __DEFAULT_CONFIG_NAME__), encoding="utf-8"
+    )
+    width, height = frame_source.resolution
+    regions = parse_regions(config_parser.get("核心", f"采集区域.{width}x{height}"))
+    # Panel defaults to the bounding box of the listing columns, like in scans
+    if "列表" not in regions:
+        regions["列表"] = bound_regions(
+            regions[name] for name in ("物品列表", "数量列", "价格列") if name in regions
+        )
+    template_registry = TemplateRegistry(
+        os.path.join(__DATA_PATH__, __IMAGES_DIR_NAME__),
+        os.path.join(tempfile.gettempdir(), __TEMPLATE_CACHE_NAME__),
+    )
+    template_registry.load(
+        frame_source.resolution, config_parser.getfloat("核心", "界面缩放")
+    )
+    return regions, template_registry
+
+
+def benchmark_ocr(replay_path: str) -> None:
+    # Labels are optional `<frame>.txt` files, one expected price per line
+    with ReplayFrameSource(replay_path) as frame_source:
+        regions, template_registry = _load_benchmark_setup(frame_source)
+        glyph_recognizer = GlyphRecognizer.from_registry(template_registry)
+        price_region = {"价格列": regions["价格列"]}
+        cells_count = labels_count = correct_count = 0
+        elapsed = 0.0
+        for _ in range(len(frame_source)):
+            price_image = frame_source.grab_regions(price_region)["价格列"]
+            start_time = time.perf_counter()
+            texts = glyph_recognizer.recognize_column(price_image)
+            elapsed += time.perf_counter() - start_time
+            cells_count += len(texts)
+            label_path = f"{os.path.splitext(frame_source.frame_path)[0]}.txt"
+            if os.path.exists(label_path):
+                with open(label_path, encoding="utf-8") as label_file:
+                    labels = label_file.read().split()
+                labels_count += len(labels)
+                correct_count += sum(map(str.__eq__, texts, labels))
+            frame_source.advance()
+    cache_info = glyph_recognizer.cache_info
+    print(f"frames: {len(frame_source)}, cells: {cells_count}")
+    print(f"throughput: {cells_count / max(elapsed, 1e-9):.1f} cells/s")
+    print(f"accuracy: {correct_count}/{labels_count}")
+    print(f"glyph cache: {cache_info.hits} hits, {cache_info.misses} misses")
+
+
+def benchmark_recognition(
+    replay_path: str, workers: str = "4", rounds: str = "5"
+) -> None:
+    # Same pages through the thread and the process backends, caches warmed
+    with ReplayFrameSource(replay_path) as frame_source:
+        regions, template_registry = _load_benchmark_setup(frame_source)
+        pages: list[dict[str, np.ndarray]] = []
+        for _ in range(len(frame_source)):
+            frames = frame_source.grab_regions(regions)
+            pages.append({name: frame.copy() for name, frame in frames.items()})
+            frame_source.advance()
+        width, height = frame_source.resolution
+        config_parser = ConfigParser()
+        config_parser.read(
+            os.path.join(__DATA_PATH__, __DEFAULT_CONFIG_NAME__), encoding="utf-8"
+        )
+        ui_scale = config_parser.getfloat("核心", "界面缩放")
+    workers_count, rounds_count = int(workers), int(rounds)
+    glyph_recognizer = GlyphRecognizer.from_registry(template_registry)
+    with ThreadPoolExecutor(workers_count) as thread_executor:
+
+        def recognize_threaded() -> int:
+            futures = [
+                thread_executor.submit(
+                    recognize_listings, glyph_recognizer, regions, frames
+                )
+                for frames in pages
+            ]
+            return sum(len(future.result()[0]) for future in futures)
+
+        thread_listings = recognize_threaded()
+        start_time = time.perf_counter()
+        for _ in range(rounds_count):
+            recognize_threaded()
+        thread_elapsed = time.perf_counter() - start_time
+    shared_frame_pool = SharedFramePool(workers_count * 2, width * height * 4)
+    with ProcessPoolExecutor(
+        workers_count,
+        initializer=_initialize_recognition_worker,
+        initargs=(
+            os.path.join(__DATA_PATH__, __IMAGES_DIR_NAME__),
+            os.path.join(tempfile.gettempdir(), __TEMPLATE_CACHE_NAME__),
+            (width, height),
+            ui_scale,
+        ),
+    ) as process_executor:
+
+        def recognize_in_processes() -> int:
+            futures: list[Future[tuple[list[Listing], list[str]]]] = []
+            for frames in pages:
+                shared_frames, _ = shared_frame_pool.store(frames)
+                future = process_executor.submit(
+                    _recognize_shared_frames, shared_frames, regions
+                )
+                future.add_done_callback(
+                    lambda _, shared_frames=shared_frames: shared_frame_pool.release(
+                        shared_frames
+                    )
+                )
+                futures.append(future)
+            return sum(len(future.result()[0]) for future in futures)
+
+        process_listings = recognize_in_processes()
+        start_time = time.perf_counter()
+        for _ in range(rounds_count):
+            recognize_in_processes()
+        process_elapsed = time.perf_counter() - start_time
+    shared_frame_pool.close()
+    pages_count = len(pages) * rounds_count
+    print(f"pages: {len(pages)} x {rounds_count} rounds, workers: {workers_count}")
+    print(
+        f"threads: {pages_count / max(thread_elapsed, 1e-9):.1f} pages/s, "
+        f"{thread_listings} listings per round"
+    )
+    print(
+        f"processes: {pages_count / max(process_elapsed, 1e-9):.1f} pages/s, "
+        f"{process_listings} listings per round"
+    )
+
+
+def benchmark_segmentation(replay_path: str, rounds: str = "20") -> None:
+    with ReplayFrameSource(replay_path) as frame_source:
+        regions, template_registry = _load_benchmark_setup(frame_source)
+        glyph_recognizer = GlyphRecognizer.from_registry(template_registry)
+        masks: list[np.ndarray] = []
+        for _ in range(len(frame_source)):
+            panel = frame_source.grab_regions({"列表": regions["列表"]})["列表"]
+            masks.append(glyph_recognizer.binarize(panel))
+            frame_source.advance()
+    rounds_count = int(rounds)
+    start_time = time.perf_counter()
+    for _ in range(rounds_count):
+        profile_results = [segment_listing(mask) for mask in masks]
+    profile_elapsed = time.perf_counter() - start_time
+    # Baseline locates rows one match at a time with the first row as template,
+    # then splits every row into cells on its own
+    first_rows = next(rows for rows, _ in profile_results if rows.size)
+    row_height = int(first_rows[0, 1] - first_rows[0, 0])
+    row_pitch = (
+        int(first_rows[1, 0] - first_rows[0, 0]) if len(first_rows) > 1 else row_height
+    )
+    first_mask = next(mask for mask in masks if mask.any())
+    template = first_mask[first_rows[0, 0] : first_rows[0, 0] + row_pitch].astype(
+        np.float32
+    )
+
+    def match_rows(mask: np.ndarray) -> list[tuple[int, int, np.ndarray]]:
+        image = mask.astype(np.float32)
+        rows: list[tuple[int, int, np.ndarray]] = []
+        top = 0
+        while top + row_pitch <= image.shape[0]:
+            window = image[top : min(top + 2 * row_pitch, image.shape[0])]
+            if window.shape[0] < row_pitch:
+                break
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCORR_NORMED)
+            _, score, _, (_, y) = cv2.minMaxLoc(scores)
+            if score < 0.3:
+                break
+            row_mask = mask[top + y : top + y + row_height]
+            rows.append(
+                (top + y, top + y + row_height, find_runs(row_mask.any(axis=0)))
+            )
+            top += y + row_pitch
+        return rows
+
+    start_time = time.perf_counter()
+    for _ in range(rounds_count):
+        template_results = [match_rows(mask) for mask in masks]
+    template_elapsed = time.perf_counter() - start_time
+    # Rows agree when found by both within two pixels
+    rows_count = sum(len(rows) for rows, _ in profile_results)
+    agreed_count = sum(
+        sum(
+            any(abs(int(top) - matched_top) <= 2 for matched_top, _, _ in matched_rows)
+            for top, _ in rows.tolist()
+        )
+        for (rows, _), matched_rows in zip(profile_results, template_results)
+    )
+    pages_count = len(masks) * rounds_count
+    print(f"pages: {len(masks)} x {rounds_count} rounds, panel: {regions['列表']}")
+    print(
+        f"projection profiles: {pages_count / max(profile_elapsed, 1e-9):.1f} pages/s, "
+        f"{rows_count} rows"
+    )
+    print(
+        f"template matching: {pages_count / max(template_elapsed, 1e-9):.1f} pages/s, "
+        f"{agreed_count}/{rows_count} rows agreed"
+    )
+
+
+def benchmark_targeted(replay_path: str, items: str = "30", pages: str = "1") -> None:
+    # Replayed searches land on replay frames, a batch counts its items as read
+    with ReplayFrameSource(replay_path, loop=True) as frame_source:
+        regions, template_registry = _load_benchmark_setup(frame_source)
+        glyph_recognizer = GlyphRecognizer.from_registry(template_registry)
+
+        def read_page() -> list[Listing]:
+            listings, _ = recognize_listings(
+                glyph_recognizer, regions, frame_source.grab_regions(regions)
+            )
+            frame_source.advance()
+            return listings
+
+        # Watched items are the first recognized names, caches end up warm
+        names = sorted(
+            {listing.name for _ in range(len(frame_source)) for listing in read_page()}
+        )
+        watched_names = set(names[: int(items)])
+        found_names: set[str] = set()
+        start_time = time.perf_counter()
+        for _ in __CATEGORY_NAMES__:
+            for _ in range(len(frame_source)):
+                found_names.update(
+                    listing.name
+                    for listing in read_page()
+                    if listing.name in watched_names
+                )
+        sweep_elapsed = time.perf_counter() - start_time
+        batches = batch_by_prefix(
+            watched_names, 2, int(pages) * __ROWS_PER_PAGE__, names
+        )
+        start_time = time.perf_counter()
+        for _ in batches:
+            for _ in range(int(pages)):
+                read_page()
+        targeted_elapsed = time.perf_counter() - start_time
+    sweep_pages = len(__CATEGORY_NAMES__) * len(frame_source)
+    print(f"watched items: {len(watched_names)}, search batches: {len(batches)}")
+    print(
+        f"sweep: {sweep_pages} pages, {len(found_names)} items, "
+        f"{len(found_names) * 60 / max(sweep_elapsed, 1e-9):.1f} items/min"
+    )
+    print(
+        f"targeted: {len(batches) * int(pages)} pages, {len(watched_names)} items, "
+        f"{len(watched_names) * 60 / max(targeted_elapsed, 1e-9):.1f} items/min"
+    )
+
+
+def benchmark_startup(rounds: str = "5") -> None:
+    # Import times come from `-X importtime`, only top level imports are summed
+    import_times: dict[str, list[int]] = {}
+    first_frame_times: list[float] = []
+    for _ in range(int(rounds)):
+        start_time = time.perf_counter()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                os.path.abspath(__file__),
+                "--debug",
+                "--first-frame",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+        )
+        assert process.stdout is not None
+        while (line := process.stdout.readline()) and line.strip() != "first frame":
+            pass
+        if not line:
+            print(f"startup failed with exit code {process.wait()}")
+            return
+        first_frame_times.append(time.perf_counter() - start_time)
+        _, importtime_output = process.communicate()
+        for line in importtime_output.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative_text, module_text = line.split("|")
+            if module_text.startswith("  "):
+                continue
+            import_times.setdefault(module_text.strip(), []).append(
+                int(cumulative_text)
+            )
+    total_import_time = sum(map(np.median, import_times.values())) / 1000
+    print(f"rounds: {rounds}")
+    print(f"time to first frame: {np.median(first_frame_times) * 1000:.1f} ms")
+    print(f"imports before first frame: {total_import_time:.1f} ms")
+    for module_name, times in sorted(
+        import_times.items(), key=lambda item: -np.median(item[1])
+    )[:10]:
+        print(f"  {module_name}: {np.median(times) / 1000:.1f} ms")
+
+
+__BENCHMARKS__: dict[str, Callable[..., None]] = {
+    "ocr": benchmark_ocr,
+    "recognition": benchmark_recognition,
+    "segmentation": benchmark_segmentation,
+    "targeted": benchmark_targeted,
+    "startup": benchmark_startup,
+}
 
 
 if __name__ == "__main__":
-    if "--debug" in sys.argv or ctypes.windll.shell32.IsUserAnAdmin():
+    # Recognition processes are spawned from the frozen executable as well
+    freeze_support()
+    if "--benchmark" in sys.argv:
+        benchmark_name, *benchmark_args = sys.argv[sys.argv.index("--benchmark") + 1 :]
+        __BENCHMARKS__[benchmark_name](*benchmark_args)
+    elif "--headless" in sys.argv:
+        # Runs as launched, there is no window to elevate
+        HeadlessProgram().run()
+    elif "--debug" in sys.argv or ctypes.windll.shell32.IsUserAnAdmin():
         try:
             Program().run()
         except Exception as runtime_error: